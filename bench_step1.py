@@ -0,0 +1,119 @@
+# -*- coding: utf-8 -*-
+"""
+bench_step1.py — Benchmark απαρίθμησης Βήματος 1
+
+Συγκρίνει την πλήρη απαρίθμηση με itertools.product (k^n αναθέσεις)
+με τον απαριθμητή ισόρροπων κανονικών αναθέσεων, για αυξανόμενο
+πλήθος παιδιών εκπαιδευτικών, και ελέγχει ότι τα αποτελέσματα ταυτίζονται.
+
+    python bench_step1.py --classes 4 --min-kids 6 --max-kids 11
+
+Με --rows μετρά επιπλέον την εφαρμογή των σεναρίων στο DataFrame και την
+εξαγωγή multi-sheet σε βιβλίο πολλών τάξεων (π.χ. --rows 3000).
+"""
+import argparse
+import contextlib
+import io
+import os
+import random
+import tempfile
+import time
+from typing import FrozenSet, List, Tuple
+
+import pandas as pd
+
+from step1_immutable_ALLINONE import Step1ImmutableProcessor, export_exact_multisheet
+
+GRADES = ("Α", "Β", "Γ", "Δ", "Ε", "ΣΤ")
+
+
+def _random_instance(n: int, seed: int = 42, p_friend: float = 0.25) -> Tuple[List[str], FrozenSet[Tuple[str, str]]]:
+    rnd = random.Random(seed)
+    kids = [f"Παιδί_{i+1:02d}" for i in range(n)]
+    pairs = {
+        (a, b) for i, a in enumerate(kids) for b in kids[i+1:]
+        if rnd.random() < p_friend
+    }
+    return kids, frozenset(pairs)
+
+
+def _timed(fn, *args):
+    with contextlib.redirect_stdout(io.StringIO()):
+        t0 = time.perf_counter()
+        out = fn(*args)
+        return out, time.perf_counter() - t0
+
+
+def bench_enumeration(num_classes: int, min_kids: int, max_kids: int) -> None:
+    proc = Step1ImmutableProcessor()
+    print(f"{'παιδιά':>7} {'k^n':>12} {'product (s)':>12} {'balanced (s)':>13} {'speedup':>9}")
+    for n in range(min_kids, max_kids + 1):
+        kids, friendships = _random_instance(n)
+        old, t_old = _timed(
+            lambda *a: proc._select_top_scenarios(proc._product_generation(*a)), kids, num_classes, friendships)
+        new, t_new = _timed(proc._exhaustive_generation, kids, num_classes, friendships)
+        assert old == new, f"Διαφορά αποτελεσμάτων για n={n}"
+        print(f"{n:>7} {num_classes ** n:>12,} {t_old:>12.3f} {t_new:>13.4f} {t_old / max(t_new, 1e-9):>8.0f}x")
+
+
+def _random_grade_sheet(grade: str, rows: int, teacher_kids: int, seed: int) -> pd.DataFrame:
+    rnd = random.Random(seed)
+    names = [f"{grade}_Μαθητής_{i+1:04d}" for i in range(rows)]
+    kids = set(rnd.sample(range(rows), teacher_kids))
+    return pd.DataFrame({
+        "ΟΝΟΜΑ": names,
+        "ΦΥΛΟ": [rnd.choice("ΑΚ") for _ in names],
+        "ΚΑΛΗ_ΓΝΩΣΗ_ΕΛΛΗΝΙΚΩΝ": [rnd.choice("ΝΟ") for _ in names],
+        "ΠΑΙΔΙ_ΕΚΠΑΙΔΕΥΤΙΚΟΥ": ["Ν" if i in kids else "Ο" for i in range(rows)],
+        "ΦΙΛΟΙ": [", ".join(rnd.sample(names, 2)) for _ in names],
+    })
+
+
+def _legacy_apply(results, df: pd.DataFrame) -> pd.DataFrame:
+    """Η παλιά εφαρμογή: μία μάσκα σε όλο τον πίνακα ανά παιδί και σενάριο"""
+    result_df = df.copy()
+    for scenario in results.scenarios:
+        result_df[scenario.column_name] = ""
+        for student_name, class_assigned in scenario.assignments.items():
+            mask = result_df["ΟΝΟΜΑ"] == student_name
+            if mask.any():
+                result_df.loc[mask, scenario.column_name] = class_assigned
+    return result_df
+
+
+def _legacy_export(df_with_step1: pd.DataFrame, output_file: str) -> None:
+    scenario_cols = [c for c in df_with_step1.columns if str(c).startswith("ΒΗΜΑ1_ΣΕΝΑΡΙΟ_")]
+    base_cols = [c for c in df_with_step1.columns if c not in scenario_cols]
+    with pd.ExcelWriter(output_file, engine="openpyxl") as writer:
+        for col in scenario_cols:
+            df_with_step1[base_cols + [col]].copy().to_excel(writer, index=False, sheet_name=str(col)[:31])
+
+
+def bench_apply(rows: int, num_classes: int, teacher_kids: int) -> None:
+    per_grade = rows // len(GRADES)
+    print(f"\n{rows} γραμμές σε {len(GRADES)} τάξεις, {teacher_kids} παιδιά εκπαιδευτικών ανά τάξη")
+    print(f"{'τάξη':>5} {'apply παλιό':>12} {'apply νέο':>10} {'export παλιό':>13} {'export νέο':>11}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for g, grade in enumerate(GRADES):
+            df = _random_grade_sheet(grade, per_grade, teacher_kids, seed=g)
+            proc = Step1ImmutableProcessor()
+            results, _ = _timed(proc.create_scenarios, df, num_classes)
+            old, t_old = _timed(_legacy_apply, results, df)
+            new, t_new = _timed(proc.apply_to_dataframe, df)
+            pd.testing.assert_frame_equal(old, new)
+            _, e_old = _timed(_legacy_export, new, os.path.join(tmp, f"old_{g}.xlsx"))
+            _, e_new = _timed(export_exact_multisheet, new, os.path.join(tmp, f"new_{g}.xlsx"))
+            print(f"{grade:>5} {t_old:>12.4f} {t_new:>10.4f} {e_old:>13.3f} {e_new:>11.3f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark απαρίθμησης σεναρίων Βήματος 1")
+    parser.add_argument("--classes", "-k", type=int, default=4, help="Αριθμός τμημάτων")
+    parser.add_argument("--min-kids", type=int, default=6, help="Ελάχιστο πλήθος παιδιών εκπαιδευτικών")
+    parser.add_argument("--max-kids", type=int, default=10, help="Μέγιστο πλήθος παιδιών εκπαιδευτικών")
+    parser.add_argument("--rows", type=int, default=0, help="Γραμμές βιβλίου για benchmark apply/export (0 = χωρίς)")
+    parser.add_argument("--grade-kids", type=int, default=12, help="Παιδιά εκπαιδευτικών ανά τάξη στο benchmark apply")
+    args = parser.parse_args()
+    bench_enumeration(args.classes, args.min_kids, args.max_kids)
+    if args.rows:
+        bench_apply(args.rows, args.classes, args.grade_kids)
@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+"""
+bench_step2.py — Έλεγχοι/benchmark βαθμολόγησης Βήματος 2
+
+Ελέγχει (property check σε τυχαία τμήματα) ότι ο πυρήνας _conflict_kernel
+δίνει ακριβώς ό,τι η σύγκριση όλων των ζευγών με _pair_conflict_penalty,
+και μετρά τους δύο τρόπους για αυξανόμενο μέγεθος τμήματος.
+
+    python bench_step2.py --trials 2000 --max-class-size 30
+"""
+import argparse
+import random
+import time
+from typing import List, Tuple
+
+import numpy as np
+
+from step_2_zoiroi_idiaterotites_FIXED_v3_PATCHED import _conflict_kernel, _pair_conflict_penalty
+
+
+def _pairwise_conflicts(classes: List[List[Tuple[bool, bool]]]) -> Tuple[int, int]:
+    """Αναφορά: κάθε ζεύγος μαθητών (Ζ, Ι) του ίδιου τμήματος"""
+    conf_sum = ped_cnt = 0
+    for members in classes:
+        for a in range(len(members)):
+            for b in range(a + 1, len(members)):
+                pen = _pair_conflict_penalty(members[a][0], members[a][1], members[b][0], members[b][1])
+                conf_sum += pen
+                ped_cnt += pen > 0
+    return conf_sum, ped_cnt
+
+
+def _type_counts(classes: List[List[Tuple[bool, bool]]]) -> np.ndarray:
+    counts = np.zeros((len(classes), 4), dtype=np.int64)
+    for c, members in enumerate(classes):
+        for z, i in members:
+            counts[c, int(z) + 2 * int(i)] += 1
+    return counts
+
+
+def _random_classes(rnd: random.Random, max_class_size: int) -> List[List[Tuple[bool, bool]]]:
+    p_z, p_i = rnd.random(), rnd.random()
+    return [
+        [(rnd.random() < p_z, rnd.random() < p_i) for _ in range(rnd.randint(0, max_class_size))]
+        for _ in range(rnd.randint(1, 6))
+    ]
+
+
+def check_kernel(trials: int, max_class_size: int, seed: int = 42) -> None:
+    rnd = random.Random(seed)
+    for t in range(trials):
+        classes = _random_classes(rnd, max_class_size)
+        expected = _pairwise_conflicts(classes)
+        got = _conflict_kernel(_type_counts(classes))
+        assert got == expected, f"trial {t}: kernel {got} != pairwise {expected}"
+    print(f"_conflict_kernel == pairwise σε {trials} τυχαίες κατανομές")
+
+
+def bench_kernel(max_class_size: int, reps: int = 200) -> None:
+    rnd = random.Random(0)
+    print(f"{'μέγεθος':>8} {'pairwise (ms)':>14} {'kernel (ms)':>12}")
+    for size in range(5, max_class_size + 1, 5):
+        classes = [[(rnd.random() < 0.3, rnd.random() < 0.2) for _ in range(size)] for _ in range(4)]
+        counts = _type_counts(classes)
+        t0 = time.perf_counter()
+        for _ in range(reps):
+            _pairwise_conflicts(classes)
+        t_pair = (time.perf_counter() - t0) / reps * 1000
+        t0 = time.perf_counter()
+        for _ in range(reps):
+            _conflict_kernel(counts)
+        t_kernel = (time.perf_counter() - t0) / reps * 1000
+        print(f"{size:>8} {t_pair:>14.3f} {t_kernel:>12.4f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Έλεγχος/benchmark βαθμολόγησης Βήματος 2")
+    parser.add_argument("--trials", type=int, default=2000, help="Τυχαίες κατανομές για τον έλεγχο")
+    parser.add_argument("--max-class-size", type=int, default=30, help="Μέγιστο μέγεθος τμήματος")
+    args = parser.parse_args()
+    check_kernel(args.trials, args.max_class_size)
+    bench_kernel(args.max_class_size)
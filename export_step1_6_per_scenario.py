@@ -3,9 +3,13 @@
 export_step1_6_per_scenario.py — ΔΙΟΡΘΩΜΕΝΟΣ exporter (1→6)
 
 Εκθέτει τη συνάρτηση:
-    build_step1_6_per_scenario(input_excel, output_excel, pick_step4="best")
+    build_step1_6_per_scenario(input_excel, output_excel, pick_step4="best",
+                               step2_max_nodes=None, step2_time_limit_s=None)
 
 Τρέχει ΟΛΟΚΛΗΡΗ τη ροή: Βήματα 1→6
+
+step2_max_nodes / step2_time_limit_s: προϋπολογισμός αναζήτησης του Βήματος 2
+ανά σενάριο (κόμβοι / δευτερόλεπτα). None = πλήρης αναζήτηση.
 """
 
 from typing import Optional, List, Tuple
@@ -33,7 +37,9 @@ def _dedup(df: pd.DataFrame) -> pd.DataFrame:
         df = df.loc[:, ~df.columns.duplicated(keep="first")]
     return df
 
-def build_step1_6_per_scenario(input_excel: str, output_excel: str, pick_step4: str = "best") -> None:
+def build_step1_6_per_scenario(input_excel: str, output_excel: str, pick_step4: str = "best",
+                               step2_max_nodes: Optional[int] = None,
+                               step2_time_limit_s: Optional[float] = None) -> None:
     root = Path(__file__).parent
     
     # Import όλων των modules
@@ -73,7 +79,13 @@ def build_step1_6_per_scenario(input_excel: str, output_excel: str, pick_step4:
             sid = _sid(s1col)
 
             # STEP 2
-            options2 = m_step2.step2_apply_FIXED_v3(df1.copy(), step1_col_name=s1col, seed=42, max_results=5)
+            options2 = m_step2.step2_apply_FIXED_v3(
+                df1.copy(), step1_col_name=s1col, seed=42, max_results=5,
+                max_nodes=step2_max_nodes, time_limit_s=step2_time_limit_s,
+            )
+            if options2 and not options2[0][2].get("search_complete", True):
+                print(f"Βήμα 2, σενάριο {sid}: εξαντλήθηκε ο προϋπολογισμός "
+                      f"({options2[0][2]['nodes']} κόμβοι) — κρατήθηκαν τα καλύτερα ως τώρα")
             if options2:
                 df2 = options2[0][1]
                 s2col = f"ΒΗΜΑ2_ΣΕΝΑΡΙΟ_{sid}"
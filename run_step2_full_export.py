@@ -1,10 +1,19 @@
 # -*- coding: utf-8 -*-
+import argparse
 from step2_finalize import export_step2_nextcol_full
-export_step2_nextcol_full(
-    step1_workbook_path="STEP1_IMMUTABLE_MULTISHEET_NODUP (6).xlsx",
-    out_xlsx_path="STEP2_NEXTCOL_FULL.xlsx",
-    seed=42,
-    max_results=5,
-    sheet_naming="ΣΕΝΑΡΙΟ_{id}",
-)
-print("OK: Δημιουργήθηκε το STEP2_NEXTCOL_FULL.xlsx")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Βήμα 2 — FULL export (ένα φύλλο ανά σενάριο)")
+    parser.add_argument("--workers", "-w", type=int, default=None,
+                        help="Διεργασίες για παράλληλη εκτέλεση των σεναρίων (default: σειριακά)")
+    args = parser.parse_args()
+
+    export_step2_nextcol_full(
+        step1_workbook_path="STEP1_IMMUTABLE_MULTISHEET_NODUP (6).xlsx",
+        out_xlsx_path="STEP2_NEXTCOL_FULL.xlsx",
+        seed=42,
+        max_results=5,
+        sheet_naming="ΣΕΝΑΡΙΟ_{id}",
+        workers=args.workers,
+    )
+    print("OK: Δημιουργήθηκε το STEP2_NEXTCOL_FULL.xlsx")
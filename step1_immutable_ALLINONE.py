@@ -20,23 +20,135 @@ from pathlib import Path
 είναι ΟΡΙΣΤΙΚΕΣ και δεν αλλάζουν ποτέ στα επόμενα βήματα.
 """
 
-from dataclasses import dataclass, field
-from typing import Dict, List, Set, Tuple, Optional, FrozenSet
+from dataclasses import dataclass, field, replace
+from typing import Dict, List, Set, Tuple, Optional, FrozenSet, Iterator, Iterable, Mapping
 import pandas as pd
 import numpy as np
 import itertools
+import heapq
+import hashlib
+import os
+import json
+import tempfile
+import time
+import contextlib
+import io
+from concurrent.futures import ProcessPoolExecutor
+import bisect
 import math
 import re
 import ast
 from pathlib import Path
 
+# Πόσα σενάρια κρατά το Βήμα 1 (χρησιμοποιούνται μόνο τα 5 καλύτερα)
+MAX_STEP1_SCENARIOS = 5
+STEP1_SEARCH_MODES = ("branch_and_bound", "exhaustive")
+# Συνιστώσες φιλιών μέχρι αυτό το μέγεθος απαριθμούνται πλήρως στο κάτω φράγμα
+COMPONENT_SPLIT_LIMIT = 10
+# Παράλληλη αναζήτηση μόνο όταν οι ισόρροπες αναθέσεις είναι τουλάχιστον τόσες
+PARALLEL_MIN_ASSIGNMENTS = 1_000_000
+SHARDS_PER_WORKER = 4
+PARALLEL_PROBE_NODES = 20_000
+# Μόνιμη cache αποτελεσμάτων (αλλάζει με STEP1_CACHE_DIR)
+STEP1_CACHE_DIR = Path(os.environ.get("STEP1_CACHE_DIR", Path.home() / ".cache" / "step1_immutable"))
+STEP1_CACHE_VERSION = 3
+# Τιμές που σημαίνουν «Ναι» (μετά από strip/upper)
+YES_VALUES = frozenset({"Ν", "ΝΑΙ", "YES", "TRUE", "1", "Y"})
+
+
+def _scenario_column_digest(df: pd.DataFrame, column_name: str) -> str:
+    """Αποτύπωμα περιεχομένου (ΟΝΟΜΑ, στήλη σεναρίου) ανεξάρτητο από το index"""
+    hashed = pd.util.hash_pandas_object(df[["ΟΝΟΜΑ", column_name]], index=False)
+    return hashlib.sha256(hashed.to_numpy().tobytes()).hexdigest()
+
+
+def _class_label(c: int) -> str:
+    """Δείκτης τμήματος -> ετικέτα ("Α1", "Α2", ...)"""
+    return f"Α{c + 1}"
+
+
+def _rgs_key(labels: Iterable, base: int) -> int:
+    """
+    Κανονικό κλειδί ανάθεσης σε O(n): τα τμήματα επαναριθμούνται κατά σειρά
+    πρώτης εμφάνισης (restricted growth string) και τα ψηφία πακετάρονται σε
+    int με βάση base (>= πλήθος τμημάτων). Δύο αναθέσεις έχουν ίδιο κλειδί ανν
+    διαφέρουν μόνο σε αναδιάταξη τμημάτων.
+    """
+    relabel: Dict = {}
+    key = 0
+    for label in labels:
+        key = key * base + relabel.setdefault(label, len(relabel))
+    return key
+
+
+def _name_positions(names: Iterable[str]) -> Dict[str, int]:
+    """Όνομα -> θέση στο names (με διπλότυπα: η τελευταία θέση, σειρά πρώτης εμφάνισης όπως στο dict)"""
+    return {name: i for i, name in enumerate(names)}
+
+
+class ScenarioAssignments(Mapping):
+    """
+    Συμπαγής ανάθεση σεναρίου (read-only Mapping όνομα -> τμήμα).
+
+    Κρατά μόνο δείκτες τμήματος στοιχισμένους με τα teacher_kids και τον πίνακα
+    θέσεων όνομα -> δείκτης (και τα δύο κοινά για όλα τα σενάρια)· οι αναζητήσεις
+    γίνονται απευθείας στους δείκτες, χωρίς λεξικό ανά σενάριο. Με διπλότυπα
+    ονόματα ισχύει ό,τι και στο dict: η τελευταία εμφάνιση κερδίζει.
+    """
+    __slots__ = ("names", "classes", "_positions")
+
+    def __init__(self, names: Tuple[str, ...], classes: Iterable[int],
+                 positions: Optional[Dict[str, int]] = None):
+        classes = tuple(classes)
+        self.names = names
+        self.classes = bytes(classes) if max(classes, default=0) < 256 else classes
+        self._positions = positions if positions is not None else _name_positions(names)
+
+    def __getitem__(self, name: str) -> str:
+        return _class_label(self.classes[self._positions[name]])
+
+    def __contains__(self, name) -> bool:
+        return name in self._positions
+
+    def __iter__(self):
+        return iter(self._positions)
+
+    def __len__(self) -> int:
+        return len(self._positions)
+
+    def __repr__(self) -> str:
+        return repr(dict(self.items()))
+
+    def __getstate__(self):
+        return self.names, self.classes
+
+    def __setstate__(self, state) -> None:
+        self.names, self.classes = state
+        self._positions = _name_positions(self.names)
+
+    def to_series(self) -> pd.Series:
+        """Όνομα -> τμήμα ως Series (μία γραμμή ανά όνομα, σειρά όπως στο Mapping)"""
+        return pd.Series([_class_label(self.classes[i]) for i in self._positions.values()],
+                         index=list(self._positions), dtype=object)
+
+    def canonical_key(self, num_classes: int) -> int:
+        """Κλειδί ανεξάρτητο από την αρίθμηση των τμημάτων (βλ. _rgs_key), με βάση num_classes"""
+        return _rgs_key((self.classes[self._positions[name]] for name in self.names), num_classes)
+
+
+def _assignment_series(assignments: Mapping[str, str]) -> pd.Series:
+    """Ανάθεση σεναρίου ως Series όνομα -> τμήμα"""
+    if isinstance(assignments, ScenarioAssignments):
+        return assignments.to_series()
+    return pd.Series(dict(assignments), dtype=object)
+
 
 @dataclass(frozen=True)
 class Step1Scenario:
     """Immutable σενάριο βήματος 1"""
     id: int
     column_name: str  # "ΒΗΜΑ1_ΣΕΝΑΡΙΟ_1"
-    assignments: Dict[str, str]  # name -> class
+    assignments: Mapping[str, str]  # name -> class (ScenarioAssignments)
     description: str
     broken_friendships: int
     metadata: Dict[str, any] = field(default_factory=dict)
@@ -58,6 +170,8 @@ class Step1Results:
     teacher_kids: Tuple[str, ...]
     num_classes: int
     creation_timestamp: str
+    column_digests: Dict[str, str] = field(default_factory=dict)  # στήλη -> αποτύπωμα
+    metadata: Dict[str, any] = field(default_factory=dict)  # μετρητές/χρόνοι απαρίθμησης
     
     def get_scenario(self, scenario_id: int) -> Optional[Step1Scenario]:
         """Επιστρέφει σενάριο με βάση ID"""
@@ -75,40 +189,59 @@ class Step1Results:
     
     def validate_immutability(self, df: pd.DataFrame) -> bool:
         """Ελέγχει ότι οι στήλες ΒΗΜΑ1_ΣΕΝΑΡΙΟ_X δεν έχουν αλλάξει"""
+        first_rows = None
         for scenario in self.scenarios:
             col_name = scenario.column_name
             if col_name not in df.columns:
                 raise ValueError(f"Λείπει στήλη {col_name} - παραβίαση immutability")
             
-            # Έλεγχος ότι οι αναθέσεις είναι οι αναμενόμενες
-            for student_name, expected_class in scenario.assignments.items():
-                student_row = df[df["ΟΝΟΜΑ"] == student_name]
-                if student_row.empty:
-                    continue
-                
-                actual_class = student_row[col_name].iloc[0]
-                if pd.notna(actual_class) and str(actual_class).strip() != expected_class:
-                    raise ValueError(
-                        f"ΠΑΡΑΒΙΑΣΗ IMMUTABILITY: {student_name} σε {col_name} "
-                        f"αναμενόταν '{expected_class}', βρέθηκε '{actual_class}'"
-                    )
+            # Αμετάβλητη στήλη από το apply_to_dataframe: αρκεί σύγκριση αποτυπώματος
+            expected_digest = self.column_digests.get(col_name)
+            if expected_digest is not None and _scenario_column_digest(df, col_name) == expected_digest:
+                continue
+            
+            # Έλεγχος ότι οι αναθέσεις είναι οι αναμενόμενες (πρώτη γραμμή ανά όνομα)
+            if first_rows is None:
+                first_rows = df[~df["ΟΝΟΜΑ"].duplicated()].set_index("ΟΝΟΜΑ")
+            expected = _assignment_series(scenario.assignments)
+            actual = first_rows[col_name].reindex(expected.index)
+            violations = actual.notna() & (actual.astype(str).str.strip() != expected)
+            if violations.any():
+                student_name = violations.idxmax()
+                raise ValueError(
+                    f"ΠΑΡΑΒΙΑΣΗ IMMUTABILITY: {student_name} σε {col_name} "
+                    f"αναμενόταν '{expected[student_name]}', βρέθηκε '{actual[student_name]}'"
+                )
         return True
 
 
 class Step1ImmutableProcessor:
     """Επεξεργαστής που εξασφαλίζει immutability του Βήματος 1"""
     
-    def __init__(self):
+    def __init__(self, search_mode: str = "branch_and_bound", workers: Optional[int] = None,
+                 cache_dir: Optional[Path] = None):
+        if search_mode not in STEP1_SEARCH_MODES:
+            raise ValueError(f"Άγνωστο search_mode: {search_mode} (επιτρεπτά: {STEP1_SEARCH_MODES})")
         self._results: Optional[Step1Results] = None
         self._is_locked: bool = False
+        self._search_mode = search_mode
+        self._workers = max(1, workers or 1)
+        self._cache_dir = Path(cache_dir) if cache_dir is not None else None
+        self._stats: Dict[str, any] = {}
     
-    def create_scenarios(self, df: pd.DataFrame, num_classes: Optional[int] = None) -> Step1Results:
-        """Δημιουργία immutable σεναρίων"""
+    def create_scenarios(self, df: pd.DataFrame, num_classes: Optional[int] = None,
+                         max_scenarios: int = MAX_STEP1_SCENARIOS) -> Step1Results:
+        """Δημιουργία immutable σεναρίων (έως max_scenarios)"""
         if self._is_locked:
             raise RuntimeError("Step1 είναι ήδη κλειδωμένο - δεν επιτρέπονται αλλαγές")
         
+        self._stats = {}
+        timings = self._stats["timings_s"] = {}
+        t_start = t_phase = time.perf_counter()
+        
         # Φόρτωση και normalization δεδομένων
         df_norm = self._normalize_dataframe(df)
+        timings["normalize"] = time.perf_counter() - t_phase
         
         # Αυτόματος υπολογισμός τμημάτων
         if num_classes is None:
@@ -117,54 +250,120 @@ class Step1ImmutableProcessor:
         print(f"Βήμα 1 - Δημιουργία immutable σεναρίων για {num_classes} τμήματα")
         
         # Εντοπισμός παιδιών εκπαιδευτικών
-        teacher_kids = self._get_teacher_kids(df_norm)
+        teacher_kids = tuple(self._get_teacher_kids(df_norm))  # κοινό με τις αναθέσεις σεναρίων
+        self._stats["teacher_kids"] = len(teacher_kids)
         if not teacher_kids:
             print("Δεν υπάρχουν παιδιά εκπαιδευτικών - κενά αποτελέσματα")
+            timings["total"] = time.perf_counter() - t_start
             return Step1Results(
                 scenarios=tuple(),
                 friendships=frozenset(),
                 teacher_kids=tuple(),
                 num_classes=num_classes,
-                creation_timestamp=pd.Timestamp.now().isoformat()
+                creation_timestamp=pd.Timestamp.now().isoformat(),
+                metadata=self._stats
             )
         
         print(f"Εντοπίστηκαν {len(teacher_kids)} παιδιά εκπαιδευτικών")
         
         # Εξαγωγή φιλιών
+        t_phase = time.perf_counter()
         friendships = self._extract_friendships(df_norm, teacher_kids)
+        timings["friendships"] = time.perf_counter() - t_phase
+        self._stats["friendships"] = len(friendships)
+        
+        # Επαναχρησιμοποίηση αποτελεσμάτων για ίδιο κανονικοποιημένο πίνακα
+        cache_path = None
+        if self._cache_dir is not None:
+            cache_key = self._cache_key(df_norm, friendships, num_classes, max_scenarios)
+            cache_path = self._cache_dir / f"{cache_key}.json"
+            cached = _load_cached_results(cache_path)
+            if cached is not None:
+                self._stats["search_method"] = "cache"
+                self._stats["scenarios_kept"] = len(cached.scenarios)
+                timings["total"] = time.perf_counter() - t_start
+                self._results = replace(cached, metadata=self._stats)
+                print(f"Φόρτωση {len(cached.scenarios)} σεναρίων από cache ({cache_path.name})")
+                return self._results
         
         # Δημιουργία σεναρίων
-        scenarios = self._generate_scenarios(teacher_kids, num_classes, friendships)
+        t_phase = time.perf_counter()
+        scenarios = self._generate_scenarios(teacher_kids, num_classes, friendships, max_scenarios)
+        timings["search"] = time.perf_counter() - t_phase
+        self._stats["scenarios_kept"] = len(scenarios)
+        timings["total"] = time.perf_counter() - t_start
         
         # Δημιουργία immutable αποτελεσμάτων
         self._results = Step1Results(
             scenarios=tuple(scenarios),
             friendships=friendships,
-            teacher_kids=tuple(teacher_kids),
+            teacher_kids=teacher_kids,
             num_classes=num_classes,
-            creation_timestamp=pd.Timestamp.now().isoformat()
+            creation_timestamp=pd.Timestamp.now().isoformat(),
+            metadata=self._stats
         )
         
         print(f"Δημιουργήθηκαν {len(scenarios)} immutable σενάρια")
+        if cache_path is not None:
+            _store_cached_results(cache_path, self._results)
         return self._results
     
+    def iter_scenarios(self, df: pd.DataFrame, num_classes: Optional[int] = None) -> Iterator[Step1Scenario]:
+        """
+        Lazy εκδοχή του create_scenarios: δίνει ένα-ένα ΟΛΑ τα έγκυρα σενάρια
+        κατά σειρά κατάταξης (λιγότερες σπασμένες φιλίες πρώτα). Ο καλών
+        σταματά όποτε θέλει και πληρώνει μόνο όσα σενάρια ζήτησε.
+        Δεν αποθηκεύει αποτελέσματα και δεν κλειδώνει τον επεξεργαστή.
+        """
+        df_norm = self._normalize_dataframe(df)
+        if num_classes is None:
+            num_classes = max(2, math.ceil(len(df_norm) / 25))
+
+        teacher_kids = self._get_teacher_kids(df_norm)
+        if not teacher_kids:
+            return
+        friendships = self._extract_friendships(df_norm, teacher_kids)
+
+        if len(teacher_kids) <= num_classes:
+            yield from self._generate_scenarios(teacher_kids, num_classes, friendships)
+            return
+
+        names = tuple(teacher_kids)
+        label_index = {f"Α{i+1}": i for i in range(num_classes)}
+        ranked = self._ranked_assignments(names, num_classes, friendships)
+        for i, (assignments, broken_count) in enumerate(ranked, 1):
+            yield Step1Scenario(
+                id=i,
+                column_name=f"ΒΗΜΑ1_ΣΕΝΑΡΙΟ_{i}",
+                assignments=self._compact_assignments(names, assignments, label_index),
+                description="Κανόνας 2: Ισόρροπη κατανομή",
+                broken_friendships=broken_count
+            )
+
     def apply_to_dataframe(self, df: pd.DataFrame) -> pd.DataFrame:
         """Εφαρμόζει τα σενάρια στο DataFrame ΚΑΙ το κλειδώνει"""
         if not self._results:
             raise RuntimeError("Δεν έχουν δημιουργηθεί σενάρια ακόμη")
         
-        result_df = df.copy()
+        # Προσθήκη στηλών ΒΗΜΑ1_ΣΕΝΑΡΙΟ_X: μία αντιστοίχιση όνομα -> τμήμα ανά σενάριο,
+        # κενό για όσους δεν είναι παιδιά εκπαιδευτικών
+        t_phase = time.perf_counter()
+        if self._results.scenarios:
+            names = df["ΟΝΟΜΑ"]
+            result_df = df.assign(**{
+                scenario.column_name: names.map(_assignment_series(scenario.assignments)).fillna("")
+                for scenario in self._results.scenarios
+            })
+        else:
+            result_df = df.copy()
         
-        # Προσθήκη στηλών ΒΗΜΑ1_ΣΕΝΑΡΙΟ_X
-        for scenario in self._results.scenarios:
-            col_name = scenario.column_name
-            result_df[col_name] = ""  # Αρχικοποίηση με κενές τιμές
-            
-            # Συμπλήρωση μόνο για παιδιά εκπαιδευτικών
-            for student_name, class_assigned in scenario.assignments.items():
-                mask = result_df["ΟΝΟΜΑ"] == student_name
-                if mask.any():
-                    result_df.loc[mask, col_name] = class_assigned
+        column_digests = {
+            scenario.column_name: _scenario_column_digest(result_df, scenario.column_name)
+            for scenario in self._results.scenarios
+        }
+        metadata = dict(self._results.metadata)
+        metadata["timings_s"] = {**metadata.get("timings_s", {}), "apply": time.perf_counter() - t_phase}
+        self._results = replace(self._results, column_digests=column_digests, metadata=metadata)
         
         # ΚΛΕΙΔΩΜΑ - μετά από αυτό δεν επιτρέπονται αλλαγές
         self._is_locked = True
@@ -225,10 +424,19 @@ class Step1ImmutableProcessor:
         
         return result
     
+    def _cache_key(self, df_norm: pd.DataFrame, friendships: FrozenSet[Tuple[str, str]],
+                   num_classes: int, max_scenarios: int) -> str:
+        """Κλειδί cache: κανονικοποιημένος πίνακας, φιλίες, τμήματα και παράμετροι αναζήτησης"""
+        digest = hashlib.sha256()
+        digest.update(repr((STEP1_CACHE_VERSION, list(map(str, df_norm.columns)), num_classes,
+                            max_scenarios, self._search_mode, sorted(friendships))).encode("utf-8"))
+        digest.update(pd.util.hash_pandas_object(df_norm, index=False).to_numpy().tobytes())
+        return digest.hexdigest()
+    
     def _norm_yesno(self, val) -> str:
         """Κανονικοποίηση Ν/Ο τιμών"""
         s = str(val).strip().upper()
-        return "Ν" if s in {"Ν", "ΝΑΙ", "YES", "TRUE", "1", "Y"} else "Ο"
+        return "Ν" if s in YES_VALUES else "Ο"
     
     def _get_teacher_kids(self, df: pd.DataFrame) -> List[str]:
         """Εντοπισμός παιδιών εκπαιδευτικών"""
@@ -249,66 +457,65 @@ class Step1ImmutableProcessor:
     
     def _extract_friendships(self, df: pd.DataFrame, teacher_kids: List[str]) -> FrozenSet[Tuple[str, str]]:
         """Εξαγωγή αμοιβαίων φιλιών μεταξύ παιδιών εκπαιδευτικών"""
-        teacher_kids_set = set(teacher_kids)
-        student_friends = {}
+        kids = list(dict.fromkeys(teacher_kids))
+        kid_index = {name: i for i, name in enumerate(kids)}
+        # adjacency[i, j]: το παιδί i δήλωσε φίλο το παιδί j
+        adjacency = np.zeros((len(kids), len(kids)), dtype=bool)
         
         # ΜΕΘΟΔΟΣ 1: Matrix-style (στήλες με ονόματα)
         friendship_cols = self._find_friendship_columns(df)
         if friendship_cols:
             print(f"Εντοπίστηκαν {len(friendship_cols)} στήλες φιλιών (matrix-style)")
             
-            for col in friendship_cols:
-                friend_name = str(col).strip()
-                if friend_name in teacher_kids_set:
-                    # Βρες ποια παιδιά εκπαιδευτικών έχουν γράψει το friend_name ως φίλο
-                    friend_mask = (df["ΟΝΟΜΑ"].isin(teacher_kids)) & (df[col].map(self._norm_yesno) == "Ν")
-                    students_who_wrote_this_friend = df[friend_mask]["ΟΝΟΜΑ"].tolist()
-                    
-                    for student in students_who_wrote_this_friend:
-                        if student != friend_name:  # Όχι φιλία με τον εαυτό του
-                            if student not in student_friends:
-                                student_friends[student] = set()
-                            student_friends[student].add(friend_name)
+            kid_cols = [col for col in friendship_cols if str(col).strip() in kid_index]
+            row_mask = df["ΟΝΟΜΑ"].isin(kid_index).to_numpy()
+            if kid_cols and row_mask.any():
+                # Όλα τα κελιά Ν/Ο σε ένα πέρασμα: γραμμές παιδιών × στήλες παιδιών
+                cells = df.loc[row_mask, kid_cols].to_numpy().astype(str)
+                marked = np.isin(np.char.upper(np.char.strip(cells)), list(YES_VALUES))
+                rows = np.array([kid_index[name] for name in df.loc[row_mask, "ΟΝΟΜΑ"]])
+                cols = np.array([kid_index[str(col).strip()] for col in kid_cols])
+                np.logical_or.at(adjacency, (rows[:, None], cols[None, :]), marked)
         
         # ΜΕΘΟΔΟΣ 2: Single-column ΦΙΛΟΙ (fallback)
         elif "ΦΙΛΟΙ" in df.columns:
             print("Χρήση στήλης ΦΙΛΟΙ (single-column)")
             
-            for _, row in df.iterrows():
-                student_name = str(row["ΟΝΟΜΑ"]).strip()
-                if student_name in teacher_kids_set:
-                    friends_str = str(row["ΦΙΛΟΙ"]).strip()
-                    if friends_str and friends_str.lower() not in ["", "nan", "none"]:
-                        # Split με διάφορα separators
-                        friends_list = []
-                        for sep in [",", ";", "|"]:
-                            if sep in friends_str:
-                                friends_list = [f.strip() for f in friends_str.split(sep)]
-                                break
-                        else:
-                            friends_list = [friends_str.strip()]  # Single friend
-                        
-                        # Φιλτράρισμα μόνο παιδιών εκπαιδευτικών
-                        valid_friends = [f for f in friends_list if f in teacher_kids_set and f != student_name]
-                        
-                        if valid_friends:
-                            student_friends[student_name] = set(valid_friends)
+            kid_rows = df.loc[df["ΟΝΟΜΑ"].isin(kid_index), ["ΟΝΟΜΑ", "ΦΙΛΟΙ"]]
+            for student_name, friends_cell in zip(kid_rows["ΟΝΟΜΑ"], kid_rows["ΦΙΛΟΙ"]):
+                student_name = str(student_name).strip()
+                friends_str = str(friends_cell).strip()
+                if friends_str and friends_str.lower() not in ["", "nan", "none"]:
+                    # Split με διάφορα separators
+                    friends_list = []
+                    for sep in [",", ";", "|"]:
+                        if sep in friends_str:
+                            friends_list = [f.strip() for f in friends_str.split(sep)]
+                            break
+                    else:
+                        friends_list = [friends_str.strip()]  # Single friend
+                    
+                    # Φιλτράρισμα μόνο παιδιών εκπαιδευτικών
+                    valid_friends = [kid_index[f] for f in friends_list if f in kid_index and f != student_name]
+                    
+                    # Η τελευταία μη κενή δήλωση για το όνομα αντικαθιστά τις προηγούμενες
+                    if valid_friends:
+                        row = kid_index[student_name]
+                        adjacency[row] = False
+                        adjacency[row, valid_friends] = True
         
         else:
             print("Δεν βρέθηκαν στήλες φιλιών")
         
-        # Έλεγχος αμοιβαιότητας: A→B ΚΑΙ B→A
-        friendships = set()
-        for student_a in student_friends:
-            friends_of_a = student_friends[student_a]
-            for student_b in friends_of_a:
-                if student_b in student_friends and student_a in student_friends[student_b]:
-                    # Αμοιβαία φιλία βρέθηκε - προσθήκη με sorted order
-                    pair = tuple(sorted([student_a, student_b]))
-                    friendships.add(pair)
+        # Έλεγχος αμοιβαιότητας: A→B ΚΑΙ B→A (χωρίς φιλία με τον εαυτό)
+        np.fill_diagonal(adjacency, False)
+        mutual_a, mutual_b = np.nonzero(np.triu(adjacency & adjacency.T, k=1))
+        friendships = frozenset(
+            tuple(sorted((kids[a], kids[b]))) for a, b in zip(mutual_a.tolist(), mutual_b.tolist())
+        )
         
         print(f"Βρέθηκαν {len(friendships)} αμοιβαίες φιλίες μεταξύ παιδιών εκπαιδευτικών")
-        return frozenset(friendships)
+        return friendships
     
     def _count_broken_friendships(self, teacher_kids: List[str], assign_map: Dict[str, str], 
                                friendships: FrozenSet[Tuple[str, str]]) -> int:
@@ -319,27 +526,43 @@ class Step1ImmutableProcessor:
                 broken += 1
         return broken
     
-    def _canonical_key(self, names: List[str], assign_map: Dict[str, str], class_labels_list: List[str]) -> Tuple:
-        """Canonical key για αποφυγή duplicates"""
-        buckets = []
-        for c in class_labels_list:
-            members = tuple(sorted([n for n in names if assign_map.get(n) == c]))
-            buckets.append(members)
-        return tuple(sorted(buckets))
+    def _friendship_positions(self, positions: Dict[str, int],
+                              friendships: FrozenSet[Tuple[str, str]]) -> Tuple[List[Tuple[int, int]], int]:
+        """
+        Φιλίες ως ζεύγη θέσεων για μέτρηση πάνω σε δείκτες τμήματος. Επιστρέφει
+        (ζεύγη, σταθερές): φιλία με ένα μόνο από τα δύο ονόματα στα παιδιά είναι
+        πάντα σπασμένη, χωρίς κανένα ποτέ (όπως στο _count_broken_friendships).
+        """
+        pairs, always_broken = [], 0
+        for friend1, friend2 in friendships:
+            i, j = positions.get(friend1), positions.get(friend2)
+            if i is not None and j is not None:
+                pairs.append((i, j))
+            elif (i is None) != (j is None):
+                always_broken += 1
+        return pairs, always_broken
+
+    def _compact_assignments(self, names: Tuple[str, ...], assignments: Mapping[str, str],
+                             label_index: Dict[str, int]) -> ScenarioAssignments:
+        """Μετατροπή ανάθεσης όνομα -> τμήμα στη συμπαγή μορφή του σεναρίου"""
+        if isinstance(assignments, ScenarioAssignments):
+            return assignments
+        return ScenarioAssignments(names, [label_index[assignments[n]] for n in names])
     
     def _generate_scenarios(self, teacher_kids: List[str], num_classes: int, 
-                          friendships: FrozenSet[Tuple[str, str]]) -> List[Step1Scenario]:
+                          friendships: FrozenSet[Tuple[str, str]],
+                          max_scenarios: int = MAX_STEP1_SCENARIOS) -> List[Step1Scenario]:
         """Δημιουργία σεναρίων με immutable structure"""
         class_labels_list = [f"Α{i+1}" for i in range(num_classes)]
+        label_index = {label: i for i, label in enumerate(class_labels_list)}
+        names = tuple(teacher_kids)
         scenarios = []
         
         if len(teacher_kids) <= num_classes:
             # ΚΑΝΟΝΑΣ 1: Σειριακή κατανομή
             print(f"Εφαρμογή Κανόνα 1 (≤1 ανά τμήμα)")
-            assignments = {}
-            
-            for i, name in enumerate(teacher_kids):
-                assignments[name] = class_labels_list[i % num_classes]
+            self._stats["search_method"] = "rule_1"
+            assignments = ScenarioAssignments(names, [i % num_classes for i in range(len(names))])
             
             scenario = Step1Scenario(
                 id=1,
@@ -351,14 +574,20 @@ class Step1ImmutableProcessor:
             scenarios.append(scenario)
         else:
             # ΚΑΝΟΝΑΣ 2: Εξαντλητική παραγωγή
-            print(f"Εφαρμογή Κανόνα 2 (εξαντλητική με φιλίες)")
-            valid_assignments = self._exhaustive_generation(teacher_kids, num_classes, friendships)
+            if self._search_mode == "branch_and_bound":
+                print(f"Εφαρμογή Κανόνα 2 (branch-and-bound με φιλίες)")
+                valid_assignments = self._branch_and_bound_generation(
+                    teacher_kids, num_classes, friendships, max_scenarios)
+            else:
+                print(f"Εφαρμογή Κανόνα 2 (εξαντλητική με φιλίες)")
+                valid_assignments = self._exhaustive_generation(
+                    teacher_kids, num_classes, friendships, max_scenarios)
             
-            for i, (assignments_dict, broken_count) in enumerate(valid_assignments[:5], 1):
+            for i, (assignments_dict, broken_count) in enumerate(valid_assignments[:max_scenarios], 1):
                 scenario = Step1Scenario(
                     id=i,
                     column_name=f"ΒΗΜΑ1_ΣΕΝΑΡΙΟ_{i}",
-                    assignments=assignments_dict,
+                    assignments=self._compact_assignments(names, assignments_dict, label_index),
                     description="Κανόνας 2: Ισόρροπη κατανομή",
                     broken_friendships=broken_count
                 )
@@ -366,51 +595,541 @@ class Step1ImmutableProcessor:
         
         return scenarios
     
-    def _exhaustive_generation(self, teacher_kids: List[str], num_classes: int, 
-                             friendships: FrozenSet[Tuple[str, str]]) -> List[Tuple[Dict[str, str], int]]:
-        """Εξαντλητική παραγωγή σεναρίων"""
-        class_labels_list = [f"Α{i+1}" for i in range(num_classes)]
+    def _balanced_assignments(self, n: int, num_classes: int):
+        """
+        Παράγει ΜΟΝΟ ισόρροπες, κανονικές αναθέσεις n παιδιών σε num_classes τμήματα.
+
+        Κάθε ανάθεση είναι tuple δεικτών τμήματος (restricted growth string):
+        το πρώτο παιδί πάει πάντα στο 0 και ένα νέο τμήμα ανοίγει μόνο ως το
+        αμέσως επόμενο αχρησιμοποίητο. Έτσι παράγεται ακριβώς ένας αντιπρόσωπος
+        ανά τροχιά αναδιάταξης τμημάτων — ο λεξικογραφικά μικρότερος, δηλαδή αυτός
+        που θα συναντούσε πρώτο το itertools.product. Η σειρά εξόδου είναι ίδια
+        με τη σειρά του itertools.product.
+        """
+        q, r = divmod(n, num_classes)
+        cap = q + 1 if r else q
+        counts = [0] * num_classes
+        labels = [0] * n
+
+        def rec(i: int, opened: int, deficit: int):
+            if i == n:
+                if opened > 1:  # ΕΛΕΓΧΟΣ 2: Όχι όλα στο ίδιο τμήμα
+                    yield tuple(labels)
+                return
+            remaining_after = n - i - 1
+            for c in range(min(opened + 1, num_classes)):
+                cnt = counts[c]
+                if cnt >= cap:
+                    continue
+                # deficit = θέσεις που λείπουν ώστε κάθε τμήμα να φτάσει τα q
+                new_deficit = deficit - 1 if cnt < q else deficit
+                if new_deficit > remaining_after:
+                    continue  # ΕΛΕΓΧΟΣ 1: Ισοκατανομή ≤1 δεν είναι πλέον εφικτή
+                counts[c] = cnt + 1
+                labels[i] = c
+                yield from rec(i + 1, max(opened, c + 1), new_deficit)
+                counts[c] = cnt
+
+        yield from rec(0, 0, q * num_classes)
+
+    def _exhaustive_generation(self, teacher_kids: List[str], num_classes: int,
+                             friendships: FrozenSet[Tuple[str, str]],
+                             top_k: int = MAX_STEP1_SCENARIOS) -> List[Tuple[ScenarioAssignments, int]]:
+        """Εξαντλητική παραγωγή σεναρίων (μόνο ισόρροπες κανονικές αναθέσεις)"""
+        if len(set(teacher_kids)) != len(teacher_kids):
+            # Διπλότυπα ονόματα: η κανονική μορφή ανά όνομα δεν ταυτίζεται με
+            # το restricted growth string — κρατάμε την πλήρη απαρίθμηση.
+            return self._select_top_scenarios(
+                self._product_generation(teacher_kids, num_classes, friendships), top_k)
+
+        names = tuple(teacher_kids)
+        positions = _name_positions(names)
+        pairs, always_broken = self._friendship_positions(positions, friendships)
+        valid_scenarios = []
+
+        print(f"Παραγωγή σεναρίων για {len(teacher_kids)} παιδιά σε {num_classes} τμήματα...")
+
+        total_combinations = num_classes ** len(teacher_kids)
+        print(f"Συνολικές περιπτώσεις: {total_combinations:,}")
+
+        for assignment in self._balanced_assignments(len(teacher_kids), num_classes):
+            broken_friendships = always_broken + sum(assignment[i] != assignment[j] for i, j in pairs)
+            valid_scenarios.append((ScenarioAssignments(names, assignment, positions), broken_friendships))
+
+        # Ανισόρροπες, μονοτμηματικές και διπλότυπες αναθέσεις δεν παράγονται καν
+        self._stats.update(search_method="balanced_enumeration", total_combinations=total_combinations,
+                           assignments_visited=len(valid_scenarios), rejected_imbalance=0,
+                           rejected_single_class=0, canonical_duplicates=0)
+        return self._select_top_scenarios(valid_scenarios, top_k)
+
+    def _count_balanced_assignments(self, n: int, num_classes: int) -> int:
+        """Πλήθος ισόρροπων κανονικών αναθέσεων (όσες παράγει το _balanced_assignments)"""
+        if num_classes < 2 or n <= num_classes:
+            return 0
+        q, r = divmod(n, num_classes)
+        denom = (math.factorial(q + 1) ** r) * (math.factorial(q) ** (num_classes - r))
+        denom *= math.factorial(r) * math.factorial(num_classes - r)
+        return math.factorial(n) // denom
+
+    def _friendship_components(self, teacher_kids: List[str],
+                               friendships: FrozenSet[Tuple[str, str]]) -> List[List[int]]:
+        """Συνεκτικές συνιστώσες του γράφου φιλιών (δείκτες στο teacher_kids, με τη σειρά του)"""
+        index = {name: i for i, name in enumerate(teacher_kids)}
+        parent = list(range(len(teacher_kids)))
+
+        def find(x: int) -> int:
+            while parent[x] != x:
+                parent[x] = parent[parent[x]]
+                x = parent[x]
+            return x
+
+        for a, b in friendships:
+            if a in index and b in index:
+                ra, rb = find(index[a]), find(index[b])
+                if ra != rb:
+                    parent[max(ra, rb)] = min(ra, rb)
+
+        groups: Dict[int, List[int]] = {}
+        for i in range(len(teacher_kids)):
+            groups.setdefault(find(i), []).append(i)
+        return sorted(groups.values(), key=lambda g: g[0])
+
+    def _component_splits(self, members: List[int], adjacency: List[Set[int]],
+                          num_classes: int, cap: int) -> Dict[Tuple[int, ...], int]:
+        """
+        Όλοι οι τρόποι να μοιραστεί μία συνιστώσα φιλιών σε τμήματα.
+
+        Επιστρέφει {μεγέθη ομάδων (φθίνουσα σειρά): ελάχιστες σπασμένες φιλίες}.
+        Το (len(members),) με κόστος 0 είναι η συνιστώσα ενωμένη· οι υπόλοιπες
+        εγγραφές είναι τα «σπασίματά» της σε έως num_classes ομάδες των ≤cap.
+        """
+        m = len(members)
+        local = {g: j for j, g in enumerate(members)}
+        earlier = [[local[g] for g in adjacency[members[j]] if local.get(g, m) < j] for j in range(m)]
+        sizes = [0] * min(num_classes, m)
+        labels = [0] * m
+        splits: Dict[Tuple[int, ...], int] = {}
+
+        def rec(j: int, opened: int, broken: int) -> None:
+            if j == m:
+                profile = tuple(sorted(sizes[:opened], reverse=True))
+                if broken < splits.get(profile, broken + 1):
+                    splits[profile] = broken
+                return
+            for c in range(min(opened + 1, len(sizes))):
+                if sizes[c] >= cap:
+                    continue
+                sizes[c] += 1
+                labels[j] = c
+                rec(j + 1, max(opened, c + 1), broken + sum(1 for t in earlier[j] if labels[t] != c))
+                sizes[c] -= 1
+
+        rec(0, 0, 0)
+        return splits
+
+    def _assignment_search(self, teacher_kids: List[str], num_classes: int,
+                           friendships: FrozenSet[Tuple[str, str]]):
+        """
+        Προετοιμάζει την αναζήτηση branch-and-bound στις ισόρροπες κανονικές
+        αναθέσεις (ίδια σειρά με το _balanced_assignments).
+
+        Επιστρέφει (walk, root_bound, stats): το walk(cutoff, limit_fn, prefix) είναι
+        generator που δίνει (σπασμένες, σειρά, ανάθεση) για κάθε φύλλο και κόβει
+        κάθε μερική ανάθεση της οποίας το κάτω φράγμα ξεπερνά το cutoff ή το
+        τρέχον limit_fn(). Με prefix ψάχνεται μόνο το υποδέντρο όπου τα πρώτα
+        παιδιά έχουν τα δοσμένα τμήματα. Το root_bound είναι το κάτω φράγμα όλης
+        της αναζήτησης.
+
+        Το κάτω φράγμα στηρίζεται στις συνιστώσες του γράφου φιλιών: κάθε
+        συνιστώσα που δεν έχει αγγιχτεί ακόμη λύνεται μόνη της (ενωμένη ή με τα
+        σπασίματά της, βλ. _component_splits) και οι λύσεις συνδυάζονται με
+        δυναμικό προγραμματισμό πάνω στα πλήθη ανά τμήμα, ώστε να τηρείται ο
+        κανόνας ισοκατανομής ≤1. Έτσι το κόστος της αναζήτησης εξαρτάται από το
+        μέγεθος των συνιστωσών και όχι από το πλήθος των παιδιών. Για τις
+        συνιστώσες που έχουν ήδη αρχίσει να τοποθετούνται μετρά τις φιλίες που
+        θα σπάσουν σίγουρα (φίλοι ήδη μοιρασμένοι σε διαφορετικά τμήματα, ή
+        συνιστώσα που δεν χωρά πλέον στο τμήμα της).
+        """
+        n = len(teacher_kids)
+        index = {name: i for i, name in enumerate(teacher_kids)}
+        adjacency: List[Set[int]] = [set() for _ in range(n)]
+        for a, b in friendships:
+            if a in index and b in index:
+                adjacency[index[a]].add(index[b])
+                adjacency[index[b]].add(index[a])
+        # Για κάθε παιδί: οι φίλοι του που τοποθετούνται αργότερα
+        later = [[j for j in adjacency[i] if j > i] for i in range(n)]
+
+        q, r = divmod(n, num_classes)
+        cap = q + 1 if r else q
+
+        # --- Συνιστώσες φιλιών ---
+        components = [c for c in self._friendship_components(teacher_kids, friendships) if len(c) > 1]
+        comp_of = [-1] * n
+        for ci, members in enumerate(components):
+            for g in members:
+                comp_of[g] = ci
+        comp_first = [members[0] for members in components]
+        comp_size = [len(members) for members in components]
+        splits = [
+            self._component_splits(members, adjacency, num_classes, cap)
+            if len(members) <= COMPONENT_SPLIT_LIMIT else None
+            for members in components
+        ]
+        print(f"Συνιστώσες φιλιών: {len(components)} (μεγέθη {sorted(comp_size, reverse=True)})")
+
+        INF = float("inf")
+        dp_memo: Dict[Tuple[int, Tuple[int, ...]], float] = {}
+
+        def untouched_bound(ci: int, counts_sorted: Tuple[int, ...]) -> float:
+            """Ελάχιστες σπασμένες φιλίες των συνιστωσών ci.. δεδομένων των πληθών ανά τμήμα"""
+            key = (ci, counts_sorted)
+            if key in dp_memo:
+                return dp_memo[key]
+            if ci == len(components):
+                # Τα υπόλοιπα παιδιά πρέπει να μπορούν να συμπληρώσουν ισόρροπα
+                best = 0 if sum(1 for c in counts_sorted if c > q) <= r else INF
+            elif splits[ci] is None:
+                # Πολύ μεγάλη συνιστώσα: μόνο το τετριμμένο φράγμα
+                best = (1 if comp_size[ci] > cap else 0) + untouched_bound(ci + 1, counts_sorted)
+            else:
+                best = INF
+                for profile, cost in splits[ci].items():
+                    if cost >= best:
+                        continue
+                    seen = set()
+                    for slots in itertools.permutations(range(num_classes), len(profile)):
+                        nxt = list(counts_sorted)
+                        for size, slot in zip(profile, slots):
+                            nxt[slot] += size
+                        if max(nxt) > cap:
+                            continue
+                        nxt_sorted = tuple(sorted(nxt))
+                        if nxt_sorted in seen:
+                            continue
+                        seen.add(nxt_sorted)
+                        best = min(best, cost + untouched_bound(ci + 1, nxt_sorted))
+            dp_memo[key] = best
+            return best
+
+        counts = [0] * num_classes
+        labels = [0] * n
+        comp_fixed = [0] * len(components)
+        comp_class = [-1] * len(components)  # κοινό τμήμα των τοποθετημένων, -1 αν είναι ήδη σπασμένη
+        started: List[int] = []              # συνιστώσες που έχουν αρχίσει να τοποθετούνται
+        # Για κάθε μη τοποθετημένο παιδί: τοποθετημένοι φίλοι του ανά τμήμα.
+        # Όσοι δεν είναι στο πλειοψηφικό τμήμα τους θα σπάσουν σίγουρα.
+        friends_in = [[0] * num_classes for _ in range(n)]
+        friends_max = [0] * n
+        friends_placed = [0] * n
+
+        def started_bound() -> int:
+            """Φράγμα για συνιστώσες που δεν χωρούν πλέον ολόκληρες στο τμήμα τους"""
+            pending: Dict[int, List[int]] = {}
+            for ci in started:
+                cl = comp_class[ci]
+                if cl >= 0 and comp_fixed[ci] < comp_size[ci]:
+                    pending.setdefault(cl, []).append(comp_size[ci] - comp_fixed[ci])
+            extra = 0
+            for cl, lefts in pending.items():
+                room = cap - counts[cl]
+                total = sum(lefts)
+                if total > room:
+                    lefts.sort()
+                    while total > room:
+                        total -= lefts.pop()
+                        extra += 1
+            return extra
+
+        stats = {"leaves": 0, "pruned": 0}
+
+        def walk(cutoff: float, limit_fn=None, prefix: Tuple[int, ...] = ()):
+            def rec(i: int, opened: int, deficit: int, broken: int, frontier: int, order: int):
+                if i == n:
+                    if opened >= 2:
+                        stats["leaves"] += 1
+                        yield broken, order, tuple(labels)
+                    return
+                remaining_after = n - i - 1
+                ci = comp_of[i]
+                next_comp = bisect.bisect_right(comp_first, i)
+                choices = range(min(opened + 1, num_classes)) if i >= len(prefix) else (prefix[i],)
+                for c in choices:
+                    cnt = counts[c]
+                    if cnt >= cap:
+                        continue
+                    new_deficit = deficit - 1 if cnt < q else deficit
+                    if new_deficit > remaining_after:
+                        continue
+                    new_broken = broken + friends_placed[i] - friends_in[i][c]
+                    counts[c] = cnt + 1
+                    labels[i] = c
+                    new_frontier = frontier - (friends_placed[i] - friends_max[i])
+                    saved_max = []
+                    for u in later[i]:
+                        saved_max.append(friends_max[u])
+                        new_frontier -= friends_placed[u] - friends_max[u]
+                        friends_in[u][c] += 1
+                        friends_placed[u] += 1
+                        if friends_in[u][c] > friends_max[u]:
+                            friends_max[u] = friends_in[u][c]
+                        new_frontier += friends_placed[u] - friends_max[u]
+                    if ci >= 0:
+                        old_class = comp_class[ci]
+                        if comp_fixed[ci] == 0:
+                            comp_class[ci] = c
+                            started.append(ci)
+                        elif old_class != c:
+                            comp_class[ci] = -1
+                        comp_fixed[ci] += 1
+
+                    # Μέγιστο αποδεκτό κάτω φράγμα
+                    limit = cutoff if limit_fn is None else min(cutoff, limit_fn())
+                    bound = new_broken + new_frontier
+                    if bound <= limit and started:
+                        bound = new_broken + max(new_frontier, started_bound())
+                    if bound <= limit and next_comp < len(components):
+                        bound += untouched_bound(next_comp, tuple(sorted(counts)))
+                    if bound > limit:
+                        stats["pruned"] += 1
+                    else:
+                        yield from rec(i + 1, max(opened, c + 1), new_deficit, new_broken, new_frontier,
+                                       order * num_classes + c)
+
+                    for u, old_max in zip(later[i], saved_max):
+                        friends_in[u][c] -= 1
+                        friends_placed[u] -= 1
+                        friends_max[u] = old_max
+                    if ci >= 0:
+                        comp_fixed[ci] -= 1
+                        comp_class[ci] = old_class
+                        if comp_fixed[ci] == 0:
+                            started.pop()
+                    counts[c] = cnt
+
+            yield from rec(0, 0, q * num_classes, 0, 0, 0)
+
+        return walk, untouched_bound(0, tuple(counts)), stats
+
+    def _shard_prefixes(self, n: int, num_classes: int, min_shards: int) -> List[Tuple[int, ...]]:
+        """Έγκυρα προθέματα (τμήματα των πρώτων παιδιών) που χωρίζουν την αναζήτηση σε ≥min_shards κομμάτια"""
+        q, r = divmod(n, num_classes)
+        cap = q + 1 if r else q
+        prefixes: List[Tuple[int, ...]] = [()]
+        while len(prefixes) < min_shards and len(prefixes[0]) < n - 1:
+            expanded = []
+            for prefix in prefixes:
+                i = len(prefix)
+                counts = [prefix.count(c) for c in range(num_classes)]
+                opened = max(prefix) + 1 if prefix else 0
+                for c in range(min(opened + 1, num_classes)):
+                    if counts[c] >= cap:
+                        continue
+                    counts[c] += 1
+                    deficit = sum(max(0, q - cnt) for cnt in counts)
+                    counts[c] -= 1
+                    if deficit <= n - i - 1:
+                        expanded.append(prefix + (c,))
+            prefixes = expanded
+        return prefixes
+
+    def _top_k_leaves(self, teacher_kids: List[str], num_classes: int,
+                      friendships: FrozenSet[Tuple[str, str]], top_k: int,
+                      prefix: Tuple[int, ...] = (), cutoff: float = float("inf"),
+                      node_budget: Optional[int] = None) -> Tuple[List[Tuple[int, int, Tuple[int, ...]]], Dict[str, int]]:
+        """
+        Τα top_k φύλλα (σπασμένες, σειρά, ανάθεση) του υποδέντρου με το δοσμένο
+        prefix και έως cutoff σπασμένες φιλίες, ταξινομημένα. Αν υπάρχουν φύλλα
+        χωρίς σπασμένες φιλίες επιστρέφονται μόνο αυτά. Με node_budget η
+        αναζήτηση σταματά νωρίς (τα φύλλα είναι τότε απλώς τα καλύτερα που βρέθηκαν).
+        """
+        walk, root_bound, stats = self._assignment_search(teacher_kids, num_classes, friendships)
+        heap: List[Tuple[int, int, Tuple[int, ...]]] = []  # (-σπασμένες, -σειρά, ανάθεση)
+        nodes = [0]
+
+        def heap_limit() -> float:
+            nodes[0] += 1
+            if node_budget is not None and nodes[0] > node_budget:
+                return -1  # εξάντληση προϋπολογισμού: κόβονται όλα
+            # Ισοβαθμία με το χειρότερο του heap χάνει (έρχεται αργότερα)
+            return -heap[0][0] - 1 if len(heap) == top_k else float("inf")
+
+        def fill(cutoff: float) -> None:
+            for broken, order, assignment in walk(cutoff, heap_limit, prefix):
+                entry = (-broken, -order, assignment)
+                if len(heap) < top_k:
+                    heapq.heappush(heap, entry)
+                else:
+                    heapq.heapreplace(heap, entry)
+
+        if root_bound == 0:
+            # Πρώτα μόνο σενάρια χωρίς σπασμένες φιλίες (αρκούν αν υπάρχουν)
+            fill(0)
+        if not heap:
+            fill(cutoff)
+        return sorted((-b, -o, a) for b, o, a in heap), stats
+
+    def _branch_and_bound_generation(self, teacher_kids: List[str], num_classes: int,
+                                     friendships: FrozenSet[Tuple[str, str]],
+                                     top_k: int = MAX_STEP1_SCENARIOS) -> List[Tuple[ScenarioAssignments, int]]:
+        """
+        Branch-and-bound για τα top_k σενάρια με τις λιγότερες σπασμένες φιλίες.
+
+        Κρατά heap με τα top_k καλύτερα (σπασμένες, σειρά εμφάνισης) και κόβει
+        κάθε μερική ανάθεση της οποίας το κάτω φράγμα (βλ. _assignment_search)
+        είναι τουλάχιστον όσο το χειρότερο του heap — οι ισοβαθμίες χάνουν πάντα
+        από τα προηγούμενα. Η τελική επιλογή είναι ίδια με του _exhaustive_generation.
+
+        Με workers > 1 και μεγάλο χώρο αναζήτησης, η αναζήτηση μοιράζεται ανά
+        πρόθεμα (τμήματα των πρώτων παιδιών) σε ProcessPoolExecutor. Κάθε
+        κομμάτι επιστρέφει τα δικά του top_k και η συγχώνευση κατά (σπασμένες,
+        σειρά) δίνει ακριβώς ό,τι και η σειριακή εκτέλεση.
+        """
+        n = len(teacher_kids)
+        total = self._count_balanced_assignments(n, num_classes)
+        if len(set(teacher_kids)) != n or total <= top_k:
+            # Διπλότυπα ονόματα ή ελάχιστα σενάρια: η απαρίθμηση είναι η απλούστερη
+            return self._exhaustive_generation(teacher_kids, num_classes, friendships, top_k)
+
+        print(f"Branch-and-bound σεναρίων για {n} παιδιά σε {num_classes} τμήματα (top {top_k})...")
+
+        if self._workers > 1 and total >= PARALLEL_MIN_ASSIGNMENTS:
+            # Σύντομη σειριακή δοκιμή για αρχικό άνω φράγμα: τα τελικά top_k δεν
+            # μπορεί να είναι χειρότερα από το χειρότερο (σπασμένες, σειρά) της
+            probe, _ = self._top_k_leaves(teacher_kids, num_classes, friendships, top_k,
+                                          node_budget=PARALLEL_PROBE_NODES)
+            prefixes = self._shard_prefixes(n, num_classes, SHARDS_PER_WORKER * self._workers)
+            tasks = []
+            for prefix in prefixes:
+                if probe and probe[0][0] == 0:
+                    cutoff = 0
+                elif len(probe) == top_k:
+                    worst_broken, worst_order, _ = probe[-1]
+                    first_order = sum(c * num_classes ** (n - 1 - i) for i, c in enumerate(prefix))
+                    # Κομμάτι εξ ολοκλήρου μετά το χειρότερο: οι ισοβαθμίες του χάνουν
+                    cutoff = worst_broken - 1 if first_order > worst_order else worst_broken
+                else:
+                    cutoff = float("inf")
+                tasks.append((teacher_kids, num_classes, friendships, top_k, prefix, cutoff))
+            print(f"Παράλληλη αναζήτηση: {len(prefixes)} κομμάτια σε {self._workers} workers")
+            with ProcessPoolExecutor(max_workers=self._workers) as pool:
+                shard_results = list(pool.map(_step1_shard_worker, tasks))
+            merged = sorted({leaf[1]: leaf for leaves, _ in shard_results for leaf in leaves + probe}.values())
+            if merged and merged[0][0] == 0:
+                merged = [leaf for leaf in merged if leaf[0] == 0]
+            ranked = merged[:top_k]
+            stats = {key: sum(st[key] for _, st in shard_results) for key in ("leaves", "pruned")}
+        else:
+            ranked, stats = self._top_k_leaves(teacher_kids, num_classes, friendships, top_k)
+
+        names = tuple(teacher_kids)
+        positions = _name_positions(names)
+        best = []
+        for _, _, assignment in ranked:
+            scenario_assignments = ScenarioAssignments(names, assignment, positions)
+            best.append((scenario_assignments,
+                         self._count_broken_friendships(teacher_kids, scenario_assignments, friendships)))
+        print(f"Branch-and-bound: {stats['leaves']:,} φύλλα, {stats['pruned']:,} κλαδέματα")
+        self._stats.update(search_method="branch_and_bound", balanced_assignments=total,
+                           assignments_visited=stats["leaves"], subtrees_pruned=stats["pruned"],
+                           rejected_imbalance=0, rejected_single_class=0, canonical_duplicates=0)
+
+        if best and best[0][1] == 0:
+            best = [s for s in best if s[1] == 0]
+            print(f"Βρέθηκαν {len(best)} (από τα top {top_k}) σενάρια χωρίς σπασμένες φιλίες")
+        print(f"Τελική επιλογή: {len(best)} σενάρια")
+        return best
+
+    def _ranked_assignments(self, teacher_kids: List[str], num_classes: int,
+                            friendships: FrozenSet[Tuple[str, str]]):
+        """
+        Lazy παραγωγή ΟΛΩΝ των έγκυρων αναθέσεων (ανάθεση, σπασμένες) κατά
+        σειρά κατάταξης: λιγότερες σπασμένες φιλίες πρώτα, και στις ισοβαθμίες
+        η σειρά της απαρίθμησης. Κάθε επίπεδο b ψάχνεται με cutoff=b, ώστε να
+        πληρώνεται μόνο όσο προχωρά ο καλών.
+        """
+        n = len(teacher_kids)
+
+        if len(set(teacher_kids)) != n:
+            valid = self._product_generation(teacher_kids, num_classes, friendships)
+            yield from sorted(valid, key=lambda s: s[1])
+            return
+
+        total = self._count_balanced_assignments(n, num_classes)
+        walk, level, _stats = self._assignment_search(teacher_kids, num_classes, friendships)
+        names = tuple(teacher_kids)
+        positions = _name_positions(names)
+        produced = 0
+        while produced < total and level <= len(friendships):
+            for broken, _order, assignment in walk(level):
+                if broken != level:
+                    continue  # δόθηκε ήδη σε προηγούμενο επίπεδο
+                produced += 1
+                yield ScenarioAssignments(names, assignment, positions), broken
+            level += 1
+
+    def _product_generation(self, teacher_kids: List[str], num_classes: int,
+                          friendships: FrozenSet[Tuple[str, str]]) -> List[Tuple[ScenarioAssignments, int]]:
+        """Πλήρης απαρίθμηση με itertools.product (αρχική υλοποίηση)"""
+        names = tuple(teacher_kids)
+        positions = _name_positions(names)
+        # Με διπλότυπα ονόματα μετρά η τελευταία εμφάνιση (όπως στο dict όνομα -> τμήμα)
+        effective_positions = [positions[name] for name in names]
+        pairs, always_broken = self._friendship_positions(positions, friendships)
         valid_scenarios = []
         seen_canonical = set()
-        
+        rejected_imbalance = rejected_single_class = canonical_duplicates = 0
+
         print(f"Παραγωγή σεναρίων για {len(teacher_kids)} παιδιά σε {num_classes} τμήματα...")
-        
+
         # Εξαντλητική παραγωγή
         total_combinations = num_classes ** len(teacher_kids)
         print(f"Συνολικές περιπτώσεις: {total_combinations:,}")
-        
-        for assignment in itertools.product(class_labels_list, repeat=len(teacher_kids)):
-            assign_map = {teacher_kids[i]: assignment[i] for i in range(len(teacher_kids))}
+
+        for assignment in itertools.product(range(num_classes), repeat=len(teacher_kids)):
+            effective = [assignment[p] for p in effective_positions]
             
             # ΕΛΕΓΧΟΣ 1: Ισοκατανομή ≤1
-            class_counts = {c: 0 for c in class_labels_list}
-            for name in teacher_kids:
-                class_counts[assign_map[name]] += 1
+            class_counts = [0] * num_classes
+            for c in effective:
+                class_counts[c] += 1
             
-            counts_list = list(class_counts.values())
-            if max(counts_list) - min(counts_list) > 1:
+            if max(class_counts) - min(class_counts) > 1:
+                rejected_imbalance += 1
                 continue  # Απόρριψη ανισοκατανομής >1
             
             # ΕΛΕΓΧΟΣ 2: Όχι όλα στο ίδιο τμήμα
-            unique_classes = set(assign_map.values())
+            unique_classes = set(effective)
             if len(unique_classes) == 1:
+                rejected_single_class += 1
                 continue  # Απόρριψη
             
-            # ΕΛΕΓΧΟΣ 3: Canonical uniqueness
-            canon_key = self._canonical_key(teacher_kids, assign_map, class_labels_list)
+            # ΕΛΕΓΧΟΣ 3: Canonical uniqueness (ίδιο με ScenarioAssignments.canonical_key)
+            canon_key = _rgs_key(effective, num_classes)
             if canon_key in seen_canonical:
+                canonical_duplicates += 1
                 continue
             seen_canonical.add(canon_key)
             
             # Υπολογισμός σπασμένων φιλιών
-            broken_friendships = self._count_broken_friendships(teacher_kids, assign_map, friendships)
+            broken_friendships = always_broken + sum(assignment[i] != assignment[j] for i, j in pairs)
             
-            valid_scenarios.append((assign_map, broken_friendships))
-        
+            valid_scenarios.append((ScenarioAssignments(names, assignment, positions), broken_friendships))
+
+        self._stats.update(search_method="product", total_combinations=total_combinations,
+                           assignments_visited=total_combinations, rejected_imbalance=rejected_imbalance,
+                           rejected_single_class=rejected_single_class,
+                           canonical_duplicates=canonical_duplicates)
+        return valid_scenarios
+
+    def _select_top_scenarios(self, valid_scenarios: List[Tuple[ScenarioAssignments, int]],
+                              top_k: int = MAX_STEP1_SCENARIOS) -> List[Tuple[ScenarioAssignments, int]]:
+        """Φιλτράρισμα έγκυρων σεναρίων στα (έως) top_k τελικά"""
         print(f"Έγκυρα σενάρια: {len(valid_scenarios)}")
+        self._stats["valid_scenarios"] = len(valid_scenarios)
         
-        # Φιλτράρισμα αν >5
-        if len(valid_scenarios) > 5:
+        # Φιλτράρισμα αν >top_k
+        if len(valid_scenarios) > top_k:
             print("Εφαρμογή φιλτραρίσματος...")
             
             # Προτεραιότητα σε σενάρια με λιγότερα σπασμένα φιλιά
@@ -423,9 +1142,9 @@ class Step1ImmutableProcessor:
                 print(f"Όλα σπάζουν φιλίες (min: {min_broken}) - ταξινόμηση")
                 valid_scenarios.sort(key=lambda x: x[1])
             
-            # Τελική επιλογή 5 σεναρίων
-            if len(valid_scenarios) > 5:
-                valid_scenarios = valid_scenarios[:5]
+            # Τελική επιλογή top_k σεναρίων
+            if len(valid_scenarios) > top_k:
+                valid_scenarios = valid_scenarios[:top_k]
         
         print(f"Τελική επιλογή: {len(valid_scenarios)} σενάρια")
         return valid_scenarios
@@ -433,22 +1152,129 @@ class Step1ImmutableProcessor:
 
 # === UTILITY FUNCTIONS ===
 
-def create_immutable_step1(df: pd.DataFrame, num_classes: Optional[int] = None) -> Tuple[pd.DataFrame, Step1Results]:
+def _step1_shard_worker(task) -> Tuple[List[Tuple[int, int, Tuple[int, ...]]], Dict[str, int]]:
+    """Worker του ProcessPoolExecutor: top_k φύλλα ενός προθέματος"""
+    teacher_kids, num_classes, friendships, top_k, prefix, cutoff = task
+    with contextlib.redirect_stdout(io.StringIO()):
+        return Step1ImmutableProcessor()._top_k_leaves(
+            teacher_kids, num_classes, friendships, top_k, prefix, cutoff)
+
+
+def _load_cached_results(cache_path: Path) -> Optional[Step1Results]:
+    """Φόρτωση από cache· χαλασμένο ή ασύμβατο αρχείο αγνοείται"""
+    try:
+        with open(cache_path, "r", encoding="utf-8") as fh:
+            payload = json.load(fh)
+        if payload.get("version") != STEP1_CACHE_VERSION:
+            return None
+        teacher_kids = tuple(payload["teacher_kids"])
+        positions = _name_positions(teacher_kids)
+        results = Step1Results(
+            scenarios=tuple(
+                Step1Scenario(**{**scenario, "assignments": ScenarioAssignments(
+                    teacher_kids, scenario["assignments"], positions)})
+                for scenario in payload["scenarios"]
+            ),
+            friendships=frozenset(tuple(pair) for pair in payload["friendships"]),
+            teacher_kids=teacher_kids,
+            num_classes=payload["num_classes"],
+            creation_timestamp=payload["creation_timestamp"],
+        )
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        print(f"Αγνόηση αρχείου cache {cache_path.name}: {e}")
+        return None
+    os.utime(cache_path)  # πρόσφατη χρήση, για το evict_step1_cache
+    return results
+
+
+def _store_cached_results(cache_path: Path, results: Step1Results) -> None:
+    """
+    Ατομική εγγραφή στην cache (μοναδικό προσωρινό αρχείο + rename, ασφαλές και
+    για ταυτόχρονες συνεδρίες στην ίδια διεργασία). Αποθηκεύεται ως JSON και όχι
+    pickle: ο φάκελος είναι κοινόχρηστος και η ανάγνωση δεν πρέπει να εκτελεί κώδικα.
+    """
+    payload = {
+        "version": STEP1_CACHE_VERSION,
+        "scenarios": [
+            {"id": sc.id, "column_name": sc.column_name, "assignments": list(sc.assignments.classes),
+             "description": sc.description, "broken_friendships": sc.broken_friendships,
+             "metadata": dict(sc.metadata)}
+            for sc in results.scenarios
+        ],
+        "friendships": sorted(results.friendships),
+        "teacher_kids": list(results.teacher_kids),
+        "num_classes": results.num_classes,
+        "creation_timestamp": results.creation_timestamp,
+    }
+    tmp_path = None
+    try:
+        cache_path.parent.mkdir(parents=True, exist_ok=True)
+        with tempfile.NamedTemporaryFile("w", encoding="utf-8", dir=cache_path.parent,
+                                         prefix=cache_path.stem, suffix=".tmp", delete=False) as fh:
+            tmp_path = fh.name
+            json.dump(payload, fh, ensure_ascii=False)
+        os.replace(tmp_path, cache_path)
+    except OSError as e:
+        print(f"Αδυναμία εγγραφής cache: {e}")
+        if tmp_path is not None:
+            with contextlib.suppress(OSError):
+                os.unlink(tmp_path)
+
+
+def evict_step1_cache(max_age_days: Optional[float] = None, cache_dir: Optional[Path] = None) -> int:
+    """
+    Διαγράφει αποθηκευμένα αποτελέσματα Βήματος 1 που δεν χρησιμοποιήθηκαν
+    τις τελευταίες max_age_days ημέρες (None = όλα). Επιστρέφει πόσα διαγράφηκαν.
+    """
+    cache_dir = Path(cache_dir) if cache_dir is not None else STEP1_CACHE_DIR
+    if not cache_dir.is_dir():
+        return 0
+    cutoff = time.time() - max_age_days * 86400 if max_age_days is not None else float("inf")
+    removed = 0
+    for entry in (*cache_dir.glob("*.json"), *cache_dir.glob("*.pkl")):  # .pkl: παλιές εκδόσεις
+        try:
+            if entry.stat().st_mtime < cutoff:
+                entry.unlink()
+                removed += 1
+        except OSError:
+            continue
+    return removed
+
+
+def create_immutable_step1(df: pd.DataFrame, num_classes: Optional[int] = None,
+                           max_scenarios: int = MAX_STEP1_SCENARIOS,
+                           workers: Optional[int] = None,
+                           use_cache: bool = True) -> Tuple[pd.DataFrame, Step1Results]:
     """
     Δημιουργεί immutable αποτελέσματα βήματος 1.
     
     Args:
         df: Αρχικό DataFrame με δεδομένα μαθητών
         num_classes: Αριθμός τμημάτων (αν None, αυτόματος υπολογισμός)
+        max_scenarios: Μέγιστος αριθμός σεναρίων (default 5)
+        workers: Διεργασίες για παράλληλη αναζήτηση σε μεγάλα σύνολα (None = σειριακά)
+        use_cache: Επαναχρησιμοποίηση αποτελεσμάτων από STEP1_CACHE_DIR για ίδια είσοδο
     
     Returns:
         (DataFrame με στήλες ΒΗΜΑ1_ΣΕΝΑΡΙΟ_X, Step1Results object)
     """
-    processor = Step1ImmutableProcessor()
-    results = processor.create_scenarios(df, num_classes)
+    processor = Step1ImmutableProcessor(workers=workers, cache_dir=STEP1_CACHE_DIR if use_cache else None)
+    processor.create_scenarios(df, num_classes, max_scenarios)
     updated_df = processor.apply_to_dataframe(df)
     
-    return updated_df, results
+    return updated_df, processor.get_results()
+
+
+def iter_step1_scenarios(df: pd.DataFrame, num_classes: Optional[int] = None) -> Iterator[Step1Scenario]:
+    """
+    Lazy παραγωγή σεναρίων βήματος 1 κατά σειρά κατάταξης (λιγότερες σπασμένες
+    φιλίες πρώτα). Π.χ. μόνο το καλύτερο σενάριο:
+
+        first = next(iter_step1_scenarios(df, num_classes=3), None)
+    """
+    return Step1ImmutableProcessor().iter_scenarios(df, num_classes)
 
 
 def validate_step1_immutability(df: pd.DataFrame, results: Step1Results) -> bool:
@@ -542,8 +1368,9 @@ def export_exact_multisheet(df_with_step1: __pd_exact.DataFrame, output_file: st
     base_cols = [c for c in df_with_step1.columns if c not in scenario_cols]
     with __ExcelWriter_exact(output_file, engine="openpyxl") as writer:
         for col in scenario_cols:
-            df_out = df_with_step1[base_cols + [col]].copy()
-            df_out.to_excel(writer, index=False, sheet_name=str(col)[:31])
+            # Επιλογή στηλών κατά την εγγραφή, χωρίς αντίγραφο του πίνακα ανά φύλλο
+            df_with_step1.to_excel(writer, index=False, sheet_name=str(col)[:31],
+                                   columns=base_cols + [col])
 
 # ===============================
 # CLI entrypoint
@@ -563,8 +1390,21 @@ if __name__ == "__main__":
     parser.add_argument("--sheet", "-s", default=None, help="(optional) Sheet name")
     parser.add_argument("--num-classes", "-n", type=int, default=None, help="Force number of classes (optional)")
     parser.add_argument("--output", "-o", default="STEP1_IMMUTABLE_MULTISHEET_NODUP.xlsx", help="Output filename")
+    parser.add_argument("--max-scenarios", type=int, default=MAX_STEP1_SCENARIOS,
+                        help=f"Max number of Step 1 scenarios (default {MAX_STEP1_SCENARIOS})")
+    parser.add_argument("--workers", "-w", type=int, default=None,
+                        help="Worker processes for large teacher-kid sets (default: serial)")
+    parser.add_argument("--stats", action="store_true",
+                        help="Print Step 1 enumeration counters and phase timings as JSON")
+    parser.add_argument("--no-cache", action="store_true",
+                        help=f"Recompute Step 1 instead of reusing {STEP1_CACHE_DIR}")
+    parser.add_argument("--evict-cache-days", type=float, default=None,
+                        help="Drop cached Step 1 results unused for this many days, then continue")
     args = parser.parse_args()
 
+    if args.evict_cache_days is not None:
+        print(f"Cache: διαγράφηκαν {evict_step1_cache(args.evict_cache_days)} αρχεία")
+
     import pandas as _pd
     src_xlsx = Path(args.input)
     if not src_xlsx.exists():
@@ -576,11 +1416,15 @@ if __name__ == "__main__":
     df0 = xl.parse(sheet_name)
 
     try:
-        df_with_step1, results_obj = create_immutable_step1(df0, num_classes=args.num_classes)
+        df_with_step1, results_obj = create_immutable_step1(
+            df0, num_classes=args.num_classes, max_scenarios=args.max_scenarios, workers=args.workers,
+            use_cache=not args.no_cache)
     except Exception as e:
         print("❌ Σφάλμα στο create_immutable_step1:", e)
         sys.exit(1)
 
     export_exact_multisheet(df_with_step1, args.output)
     print(f"✅ OK: {args.output}")
+    if args.stats:
+        print(json.dumps(results_obj.metadata, ensure_ascii=False, indent=2))
 
@@ -8,7 +8,8 @@
     και προσθέτει τη ΒΗΜΑ2_ΣΕΝΑΡΙΟ_N αμέσως δεξιά από τη ΒΗΜΑ1_ΣΕΝΑΡΙΟ_N,
     ένα φύλλο ανά σενάριο.
 """
-from typing import Optional, Tuple, List, Dict
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional, Tuple, List, Dict, Any
 import pandas as pd
 import re, math
 
@@ -42,10 +43,16 @@ def finalize_step2_assignments(
         placed_classes = pd.Series([0] * len(available_classes), index=available_classes)
     unplaced_names = result_df[unplaced_mask]["ΟΝΟΜΑ"].tolist()
     classes_by_size = placed_classes.sort_values().index.tolist()
+    # Round-robin σε μία εγγραφή: κάθε όνομα γράφεται στην ΠΡΩΤΗ γραμμή με αυτό
+    # το όνομα (σε διπλότυπα κερδίζει η τελευταία ανάθεση, όπως πριν).
+    first_row: Dict[object, int] = {}
+    for p, name in enumerate(result_df["ΟΝΟΜΑ"].tolist()):
+        first_row.setdefault(name, p)
+    targets: Dict[int, str] = {}
     for i, student_name in enumerate(unplaced_names):
-        target_class = classes_by_size[i % len(classes_by_size)]
-        student_idx = result_df[result_df["ΟΝΟΜΑ"] == student_name].index[0]
-        result_df.loc[student_idx, final_col_name] = target_class
+        targets[first_row[student_name]] = classes_by_size[i % len(classes_by_size)]
+    j = result_df.columns.get_loc(final_col_name)
+    result_df.iloc[list(targets), j] = list(targets.values())
     final_distribution = result_df[final_col_name].value_counts().to_dict()
     stats = {
         "total_students": len(result_df),
@@ -58,16 +65,18 @@ def finalize_step2_assignments(
     return result_df, stats
 
 def validate_final_assignments(df: pd.DataFrame, final_col: str) -> dict:
+    # Ένα value_counts για πλήθος τμημάτων, λίστα και μεγέθη
+    class_sizes = df[final_col].value_counts()
+    missing = pd.isna(df[final_col]).sum()
     validation = {
         "total_students": len(df),
-        "students_with_assignment": (~pd.isna(df[final_col])).sum(),
-        "students_without_assignment": pd.isna(df[final_col]).sum(),
-        "is_complete": pd.isna(df[final_col]).sum() == 0,
-        "unique_classes": df[final_col].nunique(),
-        "class_list": sorted(df[final_col].dropna().unique().tolist())
+        "students_with_assignment": len(df) - missing,
+        "students_without_assignment": missing,
+        "is_complete": missing == 0,
+        "unique_classes": len(class_sizes),
+        "class_list": sorted(class_sizes.index.tolist())
     }
     if validation["is_complete"]:
-        class_sizes = df[final_col].value_counts()
         validation.update({
             "min_class_size": class_sizes.min(),
             "max_class_size": class_sizes.max(),
@@ -88,6 +97,28 @@ def lock_step2_results(df: pd.DataFrame, step2_column: str) -> pd.DataFrame:
     return final_df
 
 # ------------------ Exporters ------------------
+def _option_key(opt):
+    label, opt_df, m = opt
+    pen = m.get("penalty") if m.get("penalty") is not None else 10**9
+    bro = m.get("broken") if m.get("broken") is not None else 10**9
+    ped = m.get("ped_conflicts") if m.get("ped_conflicts") is not None else 10**9
+    return (pen, bro, ped)
+
+def _best_step2_option(task) -> Tuple[str, pd.DataFrame, Dict[str, Any]]:
+    """Worker (και σειριακή εκτέλεση): καλύτερη επιλογή Βήματος 2 για μία στήλη ΒΗΜΑ1"""
+    from step_2_zoiroi_idiaterotites_FIXED_v3_PATCHED import step2_apply_FIXED_v3
+    df, step1_col, seed, max_results = task
+    options = step2_apply_FIXED_v3(df, step1_col, seed=seed, max_results=max_results)
+    return sorted(options, key=_option_key)[0]
+
+def _run_step2_tasks(tasks: List[tuple], workers: Optional[int]) -> List[Tuple[str, pd.DataFrame, Dict[str, Any]]]:
+    """Τα σενάρια είναι ανεξάρτητα: με workers > 1 τρέχουν σε ProcessPoolExecutor.
+    Κάθε κλήση κάνει random.seed(seed), άρα το αποτέλεσμα είναι ίδιο με τη σειριακή."""
+    if workers and workers > 1 and len(tasks) > 1:
+        with ProcessPoolExecutor(max_workers=min(workers, len(tasks))) as pool:
+            return list(pool.map(_best_step2_option, tasks))
+    return [_best_step2_option(t) for t in tasks]
+
 def export_step2_minimal_nextcol(
     step1_workbook_path: str,
     out_xlsx_path: str,
@@ -95,49 +126,47 @@ def export_step2_minimal_nextcol(
     seed: int = 42,
     max_results: int = 5,
     core_columns: Optional[List[str]] = None,
-    sheet_naming: str = "ΣΕΝΑΡΙΟ_{id}"
+    sheet_naming: str = "ΣΕΝΑΡΙΟ_{id}",
+    workers: Optional[int] = None
 ) -> None:
-    """Παλιός ελαφρύς exporter: κρατά βασικές στήλες + ΒΗΜΑ1/ΒΗΜΑ2."""
-    from step_2_zoiroi_idiaterotites_FIXED_v3_PATCHED import step2_apply_FIXED_v3
+    """Παλιός ελαφρύς exporter: κρατά βασικές στήλες + ΒΗΜΑ1/ΒΗΜΑ2.
+    workers > 1: τα σενάρια τρέχουν παράλληλα (ίδιο αρχείο με τη σειριακή εκτέλεση)."""
     from step_2_helpers_FIXED import (
-        normalize_columns, extract_step1_id, find_step1_scenario_columns, pick_core_columns
+        LoadedWorkbook, extract_step1_id, find_step1_scenario_columns, pick_core_columns
     )
 
-    xls = pd.ExcelFile(step1_workbook_path)
     seen_ids = set()
     outputs: Dict[int, Dict] = {}
+    jobs: List[Tuple[int, str]] = []
+    tasks: List[tuple] = []
 
-    for sh in xls.sheet_names:
-        df_raw = xls.parse(sh)
-        df = normalize_columns(df_raw)
+    with LoadedWorkbook(step1_workbook_path) as wb:
+        sheets = [wb.normalized(sh) for sh in wb.sheet_names]
+    for df in sheets:
         step1_cols = find_step1_scenario_columns(df)
         for step1_col in step1_cols:
             sid = extract_step1_id(step1_col)
             if sid in seen_ids:
                 continue
             seen_ids.add(sid)
+            jobs.append((sid, step1_col))
+            tasks.append((df, step1_col, seed, max_results))
 
-            options = step2_apply_FIXED_v3(df, step1_col, seed=seed, max_results=max_results)
-            def key_fn(opt):
-                label, opt_df, m = opt
-                pen = m.get("penalty") if m.get("penalty") is not None else 10**9
-                bro = m.get("broken") if m.get("broken") is not None else 10**9
-                ped = m.get("ped_conflicts") if m.get("ped_conflicts") is not None else 10**9
-                return (pen, bro, ped)
-            best_label, best_df, best_metrics = sorted(options, key=key_fn)[0]
+    for (sid, step1_col), best in zip(jobs, _run_step2_tasks(tasks, workers)):
+        best_label, best_df, best_metrics = best
 
-            step2_col = f"ΒΗΜΑ2_ΣΕΝΑΡΙΟ_{sid}"
-            if step2_col not in best_df.columns:
-                cands = [c for c in best_df.columns if str(c).startswith("ΒΗΜΑ2_")]
-                if not cands:
-                    raise RuntimeError(f"Δεν βρέθηκε στήλη ΒΗΜΑ2 για το σενάριο {sid}.")
-                step2_col = cands[0]
+        step2_col = f"ΒΗΜΑ2_ΣΕΝΑΡΙΟ_{sid}"
+        if step2_col not in best_df.columns:
+            cands = [c for c in best_df.columns if str(c).startswith("ΒΗΜΑ2_")]
+            if not cands:
+                raise RuntimeError(f"Δεν βρέθηκε στήλη ΒΗΜΑ2 για το σενάριο {sid}.")
+            step2_col = cands[0]
 
-            keep_core = pick_core_columns(best_df, core_columns)
-            cols = keep_core + [step1_col, step2_col]
-            minimal_df = best_df[cols].copy()
+        keep_core = pick_core_columns(best_df, core_columns)
+        cols = keep_core + [step1_col, step2_col]
+        minimal_df = best_df[cols].copy()
 
-            outputs[sid] = {"sheet_name": sheet_naming.format(id=sid), "df": minimal_df}
+        outputs[sid] = {"sheet_name": sheet_naming.format(id=sid), "df": minimal_df}
 
     with pd.ExcelWriter(out_xlsx_path, engine="xlsxwriter") as writer:
         for sid in sorted(outputs.keys()):
@@ -149,7 +178,8 @@ def export_step2_nextcol_full(
     *,
     seed: int = 42,
     max_results: int = 5,
-    sheet_naming: str = "ΣΕΝΑΡΙΟ_{id}"
+    sheet_naming: str = "ΣΕΝΑΡΙΟ_{id}",
+    workers: Optional[int] = None
 ) -> None:
     """
     ΝΕΟΣ DEFAULT EXPORTER — FULL:
@@ -157,10 +187,11 @@ def export_step2_nextcol_full(
     - Εκτελεί Βήμα 2 ανά σενάριο και προσθέτει τη «ΒΗΜΑ2_ΣΕΝΑΡΙΟ_{N}»
       αμέσως δεξιά από τη «ΒΗΜΑ1_ΣΕΝΑΡΙΟ_{N}». Ένα sheet ανά σενάριο.
     - Δεν γράφει καμία FINAL/audit στήλη.
+    - workers > 1: τα σενάρια τρέχουν παράλληλα σε διεργασίες· ίδιο αρχείο με τη
+      σειριακή εκτέλεση για το ίδιο seed.
     """
-    from step_2_zoiroi_idiaterotites_FIXED_v3_PATCHED import step2_apply_FIXED_v3
+    from step_2_helpers_FIXED import LoadedWorkbook
 
-    xls = pd.ExcelFile(step1_workbook_path)
     used_ids = set()
     outputs: Dict[int, Dict] = {}
 
@@ -171,45 +202,44 @@ def export_step2_nextcol_full(
     def _find_step1_cols(df: pd.DataFrame):
         return [c for c in df.columns if str(c).strip().upper().startswith("ΒΗΜΑ1_ΣΕΝΑΡΙΟ_")]
 
-    for sh in xls.sheet_names:
-        orig_df = xls.parse(sh)
+    jobs: List[Tuple[int, str, pd.DataFrame]] = []
+    tasks: List[tuple] = []
+    with LoadedWorkbook(step1_workbook_path) as wb:
+        sheets = [(wb.sheet(sh), wb.normalized(sh)) for sh in wb.sheet_names]
+    for orig_df, norm_df in sheets:
         step1_cols = _find_step1_cols(orig_df)
         for step1_col in step1_cols:
             sid = _sid_from_col(step1_col)
             if sid in used_ids:
                 continue
             used_ids.add(sid)
-
-            options = step2_apply_FIXED_v3(orig_df.copy(), step1_col, seed=seed, max_results=max_results)
-            def key_fn(opt):
-                label, opt_df, m = opt
-                pen = m.get("penalty") if m.get("penalty") is not None else 10**9
-                bro = m.get("broken") if m.get("broken") is not None else 10**9
-                ped = m.get("ped_conflicts") if m.get("ped_conflicts") is not None else 10**9
-                return (pen, bro, ped)
-            best_label, best_df, best_metrics = sorted(options, key=key_fn)[0]
-
-            step2_col = f"ΒΗΜΑ2_ΣΕΝΑΡΙΟ_{sid}"
-            if step2_col not in best_df.columns:
-                cands = [c for c in best_df.columns if str(c).startswith("ΒΗΜΑ2_")]
-                if not cands:
-                    raise RuntimeError(f"Δεν βρέθηκε στήλη ΒΗΜΑ2 στο αποτέλεσμα για σενάριο {sid}.")
-                step2_col = cands[0]
-
-            if "ΟΝΟΜΑ" not in orig_df.columns:
-                raise RuntimeError("Το αρχικό φύλλο δεν έχει στήλη 'ΟΝΟΜΑ'.")
-            s_step2 = best_df.set_index("ΟΝΟΜΑ")[step2_col]
-            merged = orig_df.copy()
-            merged[step2_col] = merged["ΟΝΟΜΑ"].map(s_step2.to_dict())
-
-            cols = merged.columns.tolist()
-            if step2_col in cols:
-                cols.remove(step2_col)
-            idx = cols.index(step1_col) + 1 if step1_col in cols else len(cols)
-            cols = cols[:idx] + [step2_col] + cols[idx:]
-            merged = merged[cols]
-
-            outputs[sid] = {"sheet_name": sheet_naming.format(id=sid), "df": merged}
+            jobs.append((sid, step1_col, orig_df))
+            tasks.append((norm_df, step1_col, seed, max_results))
+
+    for (sid, step1_col, orig_df), best in zip(jobs, _run_step2_tasks(tasks, workers)):
+        best_label, best_df, best_metrics = best
+
+        step2_col = f"ΒΗΜΑ2_ΣΕΝΑΡΙΟ_{sid}"
+        if step2_col not in best_df.columns:
+            cands = [c for c in best_df.columns if str(c).startswith("ΒΗΜΑ2_")]
+            if not cands:
+                raise RuntimeError(f"Δεν βρέθηκε στήλη ΒΗΜΑ2 στο αποτέλεσμα για σενάριο {sid}.")
+            step2_col = cands[0]
+
+        if "ΟΝΟΜΑ" not in orig_df.columns:
+            raise RuntimeError("Το αρχικό φύλλο δεν έχει στήλη 'ΟΝΟΜΑ'.")
+        s_step2 = best_df.set_index("ΟΝΟΜΑ")[step2_col]
+        merged = orig_df.copy(deep=False)
+        merged[step2_col] = merged["ΟΝΟΜΑ"].map(s_step2.to_dict())
+
+        cols = merged.columns.tolist()
+        if step2_col in cols:
+            cols.remove(step2_col)
+        idx = cols.index(step1_col) + 1 if step1_col in cols else len(cols)
+        cols = cols[:idx] + [step2_col] + cols[idx:]
+        merged = merged[cols]
+
+        outputs[sid] = {"sheet_name": sheet_naming.format(id=sid), "df": merged}
 
     with pd.ExcelWriter(out_xlsx_path, engine="xlsxwriter") as writer:
         for sid in sorted(outputs.keys()):
@@ -11,8 +11,9 @@ from typing import List, Tuple, Dict, Optional
 import pandas as pd
 import re
 from pathlib import Path
+from step_2_helpers_FIXED import LoadedWorkbook
 from step_3_helpers_FIXED import (
-    parse_friends_string, are_mutual_pair, mutual_dyads,
+    mutual_dyads, mutual_adjacency,
     count_broken_dyads, calculate_penalty_score_step3, select_best_scenarios
 )
 
@@ -29,14 +30,18 @@ def _class_fits(df: pd.DataFrame, col: str, class_name: str, add: int=1) -> bool
 def apply_step3_on_sheet(
     df2: pd.DataFrame,
     scenario_col: str,
-    num_classes: Optional[int] = None) -> Tuple[pd.DataFrame, Dict]:
+    num_classes: Optional[int] = None,
+    adjacency: Optional[Dict[str, List[str]]] = None) -> Tuple[pd.DataFrame, Dict]:
     """
     Παίρνει ένα DataFrame από Βήμα 2 (ένα sheet) και επιστρέφει:
     - df_after: με νέα στήλη ΒΗΜΑ3_ΣΕΝΑΡΙΟ_k (ίδιο όνομα με το sheet αλλά με 'ΒΗΜΑ3')
     - meta: {"broken": int, "penalty": int}
     Κανόνας: τοποθετούμε ΜΟΝΟ δυάδες (u,v) όπου u είναι unplaced, v είναι placed, και είναι αμοιβαία φίλοι.
+    adjacency: έτοιμο mutual_adjacency(df2) για επαναχρησιμοποίηση (αλλιώς χτίζεται εδώ).
     """
     df = df2.copy()
+    if adjacency is None:
+        adjacency = mutual_adjacency(df2)
     # νέα στήλη
     new_col = re.sub(r"^ΒΗΜΑ2", "ΒΗΜΑ3", scenario_col)
     df[new_col] = df[scenario_col]
@@ -47,9 +52,7 @@ def apply_step3_on_sheet(
 
     # δώσε προτεραιότητα σε όσους έχουν ΑΚΡΙΒΩΣ 1 αμοιβαίο φίλο (μονοσήμαντες δυάδες)
     def mutual_friends_of(u: str) -> list:
-        cell = df.loc[df["ΟΝΟΜΑ"]==u, "ΦΙΛΟΙ"]
-        friends = parse_friends_string(cell.values[0] if not cell.empty else "")
-        return [v for v in friends if are_mutual_pair(df, u, v)]
+        return adjacency.get(u, [])
     # κατασκεύασε λίστα (u, v, class_v) για v ήδη placed
     candidates = []
     for u in unplaced_names:
@@ -72,7 +75,7 @@ def apply_step3_on_sheet(
             placed[u] = cl
 
     # Μετρικά
-    broken = count_broken_dyads(df2, df, new_col)
+    broken = count_broken_dyads(df2, df, new_col, adjacency)
     num_classes = _auto_num_classes(df, num_classes)
     penalty = calculate_penalty_score_step3(df, new_col, num_classes)
     meta = {"broken": int(broken), "penalty": int(penalty)}
@@ -98,10 +101,11 @@ def apply_step3_to_dataframe(df_step2: pd.DataFrame, num_classes: Optional[int]
         raise ValueError("Δεν βρέθηκαν στήλες ΒΗΜΑ2_ΣΕΝΑΡΙΟ_* στο DataFrame")
     
     results = []
+    adjacency = mutual_adjacency(df_step2)  # ίδιο για όλες τις στήλες ΒΗΜΑ2
     
     # Εφαρμογή Βήματος 3 σε κάθε στήλη ΒΗΜΑ2
     for scenario_col in step2_columns:
-        df_after, meta = apply_step3_on_sheet(df_step2, scenario_col, num_classes)
+        df_after, meta = apply_step3_on_sheet(df_step2, scenario_col, num_classes, adjacency)
         
         # Εξαγωγή της νέας στήλης ΒΗΜΑ3
         new_col = re.sub(r"^ΒΗΜΑ2", "ΒΗΜΑ3", scenario_col)
@@ -126,19 +130,20 @@ def step3_run_all_from_step2(step2_xlsx_path: str, output_xlsx_path: str) -> str
     """
     p = Path(step2_xlsx_path)
     assert p.exists(), f"Δεν βρέθηκε: {p}"
-    xls = pd.ExcelFile(p)
-    s2_sheets = [s for s in xls.sheet_names if s.startswith("ΒΗΜΑ2_ΣΕΝΑΡΙΟ_")]
-    if not s2_sheets:
-        raise ValueError("Δεν βρέθηκαν sheets 'ΒΗΜΑ2_ΣΕΝΑΡΙΟ_*' στο αρχείο Βήμα 2.")
+    with LoadedWorkbook(p) as wb:
+        s2_sheets = [s for s in wb.sheet_names if s.startswith("ΒΗΜΑ2_ΣΕΝΑΡΙΟ_")]
+        if not s2_sheets:
+            raise ValueError("Δεν βρέθηκαν sheets 'ΒΗΜΑ2_ΣΕΝΑΡΙΟ_*' στο αρχείο Βήμα 2.")
+        # Κάθε φύλλο διαβάζεται μία φορά
+        sheets = [(s, wb.sheet(s)) for s in s2_sheets]
 
     # ΔΙΟΡΘΩΣΗ: Φόρτωση οποιουδήποτε sheet για να πάρουμε το μέγεθος
-    df0 = pd.read_excel(p, sheet_name=s2_sheets[0])
+    df0 = sheets[0][1]
     N = len(df0)
     num_classes = _auto_num_classes(df0, None)
 
     results = []
-    for s in s2_sheets:
-        df2 = pd.read_excel(p, sheet_name=s)
+    for s, df2 in sheets:
         df3, meta = apply_step3_on_sheet(df2, scenario_col=s, num_classes=num_classes)
         results.append((re.sub(r"^ΒΗΜΑ2", "ΒΗΜΑ3", s), df3, meta))
 
@@ -170,12 +175,12 @@ def export_step3_nextcol_full(step2_xlsx_path: str, out_xlsx_path: str) -> str:
 
     p = Path(step2_xlsx_path)
     assert p.exists(), f"Δεν βρέθηκε: {p}"
-    xls = pd.ExcelFile(p)
+    with LoadedWorkbook(p) as wb:
+        sheets = [wb.sheet(sh) for sh in wb.sheet_names]
 
     outputs = []
-    for sh in xls.sheet_names:
+    for df2 in sheets:
         # Δουλεύουμε με κάθε "ΣΕΝΑΡΙΟ_k" sheet
-        df2 = pd.read_excel(p, sheet_name=sh)
         # βρες τη στήλη ΒΗΜΑ2_ΣΕΝΑΡΙΟ_k
         s2_cols = [c for c in df2.columns if str(c).strip().upper().startswith("ΒΗΜΑ2_ΣΕΝΑΡΙΟ_")]
         if not s2_cols:
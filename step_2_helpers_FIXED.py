@@ -1,5 +1,5 @@
 # -*- coding: utf-8 -*-
-from typing import List, Dict, Set, Optional
+from typing import List, Dict, Set, Optional, Tuple
 import pandas as pd, re, ast
 
 # ✅ Βασικοί τίτλοι που κρατάμε σε κάθε minimal export
@@ -75,26 +75,41 @@ def are_mutual_friends(df: pd.DataFrame, a: str, b: str) -> bool:
     fb = set(parse_friends_cell(rb.iloc[0].get("ΦΙΛΟΙ","")))
     return (str(b).strip() in fa) and (str(a).strip() in fb)
 
+def yes_mask(df: pd.DataFrame, col: str) -> pd.Series:
+    """Μάσκα «Ν» για στήλη Ν/Ο (όλα False αν λείπει η στήλη)."""
+    if col not in df.columns:
+        return pd.Series(False, index=df.index)
+    return df[col].astype(str).str.strip() == "Ν"
+
 def scope_step2(df: pd.DataFrame, step1_col: str) -> Set[str]:
-    s = set()
-    for _, r in df.iterrows():
-        placed = pd.notna(r.get(step1_col))
-        z = str(r.get("ΖΩΗΡΟΣ","")).strip()=="Ν"
-        i = str(r.get("ΙΔΙΑΙΤΕΡΟΤΗΤΑ","")).strip()=="Ν"
-        pk = str(r.get("ΠΑΙΔΙ_ΕΚΠΑΙΔΕΥΤΙΚΟΥ","")).strip()=="Ν"
-        if (not placed and (z or i)) or (placed and pk):
-            s.add(str(r.get("ΟΝΟΜΑ","")).strip())
-    return s
-
-def mutual_pairs_in_scope(df: pd.DataFrame, scope: Set[str]):
+    placed = df[step1_col].notna() if step1_col in df.columns else pd.Series(False, index=df.index)
+    zi = yes_mask(df, "ΖΩΗΡΟΣ") | yes_mask(df, "ΙΔΙΑΙΤΕΡΟΤΗΤΑ")
+    mask = (~placed & zi) | (placed & yes_mask(df, "ΠΑΙΔΙ_ΕΚΠΑΙΔΕΥΤΙΚΟΥ"))
+    names = df["ΟΝΟΜΑ"].map(str).str.strip() if "ΟΝΟΜΑ" in df.columns else pd.Series("", index=df.index)
+    return set(names[mask])
+
+def friends_map(df: pd.DataFrame) -> Dict[str, Set[str]]:
+    """ΟΝΟΜΑ -> σύνολο ΦΙΛΟΙ, ένα parse ανά όνομα (πρώτη γραμμή, όπως η are_mutual_friends)."""
+    cells = df["ΦΙΛΟΙ"].tolist() if "ΦΙΛΟΙ" in df.columns else [""] * len(df)
+    friends: Dict[str, Set[str]] = {}
+    for name, cell in zip(df["ΟΝΟΜΑ"].astype(str), cells):
+        if name not in friends:
+            friends[name] = set(parse_friends_cell(cell))
+    return friends
+
+def mutual_pairs_in_scope(df: pd.DataFrame, scope: Set[str],
+                          friends: Optional[Dict[str, Set[str]]] = None) -> List[Tuple[str, str]]:
+    """Αμοιβαία ζεύγη (a < b) μέσα στο scope, ταξινομημένα, σε O(Σ βαθμών).
+    Ο χάρτης φίλων (friends_map) μπορεί να δοθεί έτοιμος για επαναχρησιμοποίηση."""
     scope = {str(x).strip() for x in scope if str(x).strip()}
+    if friends is None:
+        friends = friends_map(df)
     pairs = []
-    names = sorted(scope)
-    for i, a in enumerate(names):
-        for b in names[i+1:]:
-            if are_mutual_friends(df, a, b):
-                pairs.append((a,b))
-    return pairs
+    for a in scope:
+        for b in friends.get(a, ()):
+            if b > a and b in scope and a in friends.get(b, ()):
+                pairs.append((a, b))
+    return sorted(pairs)
 
 # --------- ΝΕΑ βοηθητικά για το minimal export ---------
 def extract_step1_id(step1_col_name: str) -> int:
@@ -107,3 +122,41 @@ def find_step1_scenario_columns(df: pd.DataFrame) -> List[str]:
 def pick_core_columns(df: pd.DataFrame, core_list: Optional[List[str]] = None) -> List[str]:
     base = core_list or CORE_COLUMNS_DEFAULT
     return [c for c in base if c in df.columns]
+
+# --------- Κοινή φόρτωση workbook για τους exporters Βήματος 2/3 ---------
+class LoadedWorkbook:
+    """
+    Workbook ανοιγμένο ΜΙΑ φορά: κάθε φύλλο διαβάζεται το πολύ μία φορά και
+    κανονικοποιείται (normalize_columns) το πολύ μία φορά. Οι sheet()/normalized()
+    δίνουν ρηχά αντίγραφα (views) του cache — διάβασμα ή προσθήκη στηλών, όχι
+    αλλαγή τιμών στη θέση τους.
+    """
+    def __init__(self, path):
+        self._xls = pd.ExcelFile(path)
+        self.sheet_names: List[str] = list(self._xls.sheet_names)
+        self._raw: Dict[str, pd.DataFrame] = {}
+        self._norm: Dict[str, pd.DataFrame] = {}
+
+    def _parsed(self, sheet: str) -> pd.DataFrame:
+        if sheet not in self._raw:
+            self._raw[sheet] = self._xls.parse(sheet)
+        return self._raw[sheet]
+
+    def sheet(self, sheet: str) -> pd.DataFrame:
+        """Το φύλλο όπως είναι στο αρχείο."""
+        return self._parsed(sheet).copy(deep=False)
+
+    def normalized(self, sheet: str) -> pd.DataFrame:
+        """Το φύλλο μετά από normalize_columns."""
+        if sheet not in self._norm:
+            self._norm[sheet] = normalize_columns(self._parsed(sheet))
+        return self._norm[sheet].copy(deep=False)
+
+    def close(self) -> None:
+        self._xls.close()
+
+    def __enter__(self) -> "LoadedWorkbook":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
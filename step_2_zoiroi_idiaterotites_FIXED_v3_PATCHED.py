@@ -5,10 +5,14 @@ Step 2 — Ζωηροί & Ιδιαιτερότητες (Fixed v3, patched)
   όπου k είναι ο αριθμός από το step1_col_name (π.χ. ΒΗΜΑ1_ΣΕΝΑΡΙΟ_2 -> k=2).
 - Δεν δημιουργεί FINAL/audit στήλες. Μόνο τη στήλη ΒΗΜΑ2.
 """
+import bisect
+from collections import Counter
 from typing import List, Dict, Tuple, Any, Set, Optional
+import numpy as np
 import pandas as pd
 import random
 import re
+import time
 
 def _auto_num_classes(df, override=None):
     import math
@@ -18,7 +22,7 @@ def _auto_num_classes(df, override=None):
     return int(k if override is None else override)
 
 from step_2_helpers_FIXED import (
-    normalize_columns, parse_friends_cell, scope_step2, mutual_pairs_in_scope
+    normalize_columns, parse_friends_cell, scope_step2, mutual_pairs_in_scope, yes_mask
 )
 
 RANDOM_SEED = 42
@@ -30,70 +34,39 @@ def _pair_conflict_penalty(aZ, aI, bZ, bI) -> int:
     if aZ and bZ: return 3
     return 0
 
-def _count_ped_conflicts(df: pd.DataFrame, col: str) -> int:
-    cnt = 0
-    by_class = {}
-    for _, r in df.iterrows():
-        cl = r.get(col)
-        if pd.isna(cl): continue
-        by_class.setdefault(str(cl), []).append(r)
-    for _cl, rows in by_class.items():
-        for i in range(len(rows)):
-            for j in range(i + 1, len(rows)):
-                aZ = str(rows[i].get("ΖΩΗΡΟΣ", "")).strip() == "Ν"
-                aI = str(rows[i].get("ΙΔΙΑΙΤΕΡΟΤΗΤΑ", "")).strip() == "Ν"
-                bZ = str(rows[j].get("ΖΩΗΡΟΣ", "")).strip() == "Ν"
-                bI = str(rows[j].get("ΙΔΙΑΙΤΕΡΟΤΗΤΑ", "")).strip() == "Ν"
-                if _pair_conflict_penalty(aZ, aI, bZ, bI) > 0:
-                    cnt += 1
-    return cnt
-
-def _sum_conflicts(df: pd.DataFrame, col: str) -> int:
-    s = 0
-    by_class = {}
-    for _, r in df.iterrows():
-        cl = r.get(col)
-        if pd.isna(cl): continue
-        by_class.setdefault(str(cl), []).append(r)
-    for _cl, rows in by_class.items():
-        for i in range(len(rows)):
-            for j in range(i + 1, len(rows)):
-                aZ = str(rows[i].get("ΖΩΗΡΟΣ", "")).strip() == "Ν"
-                aI = str(rows[i].get("ΙΔΙΑΙΤΕΡΟΤΗΤΑ", "")).strip() == "Ν"
-                bZ = str(rows[j].get("ΖΩΗΡΟΣ", "")).strip() == "Ν"
-                bI = str(rows[j].get("ΙΔΙΑΙΤΕΡΟΤΗΤΑ", "")).strip() == "Ν"
-                s += _pair_conflict_penalty(aZ, aI, bZ, bI)
-    return s
-
-def _broken_mutual_pairs(df: pd.DataFrame, col: str, scope: Set[str]) -> int:
-    pairs = mutual_pairs_in_scope(df, scope)
-    name2class = {
-        str(r["ΟΝΟΜΑ"]).strip(): str(r.get(col))
-        for _, r in df.iterrows()
-        if pd.notna(r.get(col))
-    }
-    return sum(1 for a, b in pairs if name2class.get(a) != name2class.get(b))
+def _conflict_kernel(type_counts: np.ndarray) -> Tuple[int, int]:
+    """
+    (άθροισμα ποινών, πλήθος ζευγών με ποινή) μέσα στα τμήματα, σε O(k) από τα
+    πλήθη τύπων ανά τμήμα: type_counts[c] = [κανένα, μόνο Ζ, μόνο Ι, Ζ και Ι].
+    Ίδιο αποτέλεσμα με _pair_conflict_penalty σε κάθε ζεύγος του τμήματος:
+    με i = #Ι (μόνο Ι ή Ζ+Ι) και z = #μόνο Ζ, τα ζεύγη Ι–Ι δίνουν 5, Ι–Ζ 4, Ζ–Ζ 3.
+    """
+    counts = np.asarray(type_counts, dtype=np.int64).reshape(-1, 4)
+    z = counts[:, 1]
+    i = counts[:, 2] + counts[:, 3]
+    conf_sum = 5 * (i * (i - 1) // 2) + 4 * i * z + 3 * (z * (z - 1) // 2)
+    zi = i + z
+    return int(conf_sum.sum()), int((zi * (zi - 1) // 2).sum())
 
 def _compute_targets_global(df: pd.DataFrame, step1_col: str, class_labels: List[str]) -> Dict[str, Dict[str, int]]:
+    placed = df[step1_col].notna()
+    z = yes_mask(df, "ΖΩΗΡΟΣ")
+    i = yes_mask(df, "ΙΔΙΑΙΤΕΡΟΤΗΤΑ")
+
+    # Ζ/Ι ανά τμήμα Βήματος 1 με ένα grouped count
+    per_class = pd.DataFrame({"Z": z[placed], "I": i[placed]}).groupby(df.loc[placed, step1_col].astype(str)).sum()
     Z_step1 = {cl: 0 for cl in class_labels}
     I_step1 = {cl: 0 for cl in class_labels}
-    Z_total_step1 = 0
-    I_total_step1 = 0
-    for _, r in df.iterrows():
-        cl = r.get(step1_col)
-        z = str(r.get("ΖΩΗΡΟΣ", "")).strip() == "Ν"
-        i = str(r.get("ΙΔΙΑΙΤΕΡΟΤΗΤΑ", "")).strip() == "Ν"
-        if not pd.isna(cl):
-            if z:
-                Z_step1[str(cl)] += 1
-                Z_total_step1 += 1
-            if i:
-                I_step1[str(cl)] += 1
-                I_total_step1 += 1
-
-    to_place = df[pd.isna(df[step1_col])]
-    Z_to_place = int((to_place["ΖΩΗΡΟΣ"].astype(str).str.strip() == "Ν").sum())
-    I_to_place = int((to_place["ΙΔΙΑΙΤΕΡΟΤΗΤΑ"].astype(str).str.strip() == "Ν").sum())
+    for cl, zc, ic in zip(per_class.index, per_class["Z"], per_class["I"]):
+        if (zc or ic) and cl not in Z_step1:
+            raise KeyError(cl)  # Ζ/Ι σε τμήμα εκτός class_labels
+        if cl in Z_step1:
+            Z_step1[cl], I_step1[cl] = int(zc), int(ic)
+    Z_total_step1 = int(z[placed].sum())
+    I_total_step1 = int(i[placed].sum())
+
+    Z_to_place = int(z[~placed].sum())
+    I_to_place = int(i[~placed].sum())
 
     Z_final_total = Z_total_step1 + Z_to_place
     I_final_total = I_total_step1 + I_to_place
@@ -109,39 +82,64 @@ def _compute_targets_global(df: pd.DataFrame, step1_col: str, class_labels: List
         "I_step1": I_step1,
     }
 
-def _prereject(assign_map, next_name, next_cl, df, step1_col, class_labels, targets) -> bool:
-    Zc = targets["Z_step1"].copy()
-    Ic = targets["I_step1"].copy()
-    tmp = assign_map.copy()
-    if next_name and next_cl:
-        tmp[next_name] = next_cl
-
-    for n, cl in tmp.items():
-        row = df[df["ΟΝΟΜΑ"] == n].iloc[0]
-        if str(row.get("ΖΩΗΡΟΣ", "")).strip() == "Ν": Zc[cl] += 1
-        if str(row.get("ΙΔΙΑΙΤΕΡΟΤΗΤΑ", "")).strip() == "Ν": Ic[cl] += 1
-
-    for cl in class_labels:
-        if Zc[cl] > targets["Z"]["max"]: return False
-        if Ic[cl] > targets["I"]["max"]: return False
-
-    if next_name and next_cl and "ΣΥΓΚΡΟΥΣΗ" in df.columns:
-        mask_next = (df["ΟΝΟΜΑ"] == next_name)
-        next_conf_cell = df.loc[mask_next, "ΣΥΓΚΡΟΥΣΗ"]
-        toks_next = set(parse_friends_cell(next_conf_cell.values[0] if not next_conf_cell.empty else ""))
-
-        fixed_same = df[(pd.notna(df[step1_col])) & (df[step1_col] == next_cl)]
-        if any((n in toks_next) for n in fixed_same["ΟΝΟΜΑ"].astype(str).tolist()):
-            return False
-
-        for n2, cl2 in tmp.items():
-            if cl2 != next_cl: continue
-            mask_n2 = (df["ΟΝΟΜΑ"] == n2)
-            n2_conf_cell = df.loc[mask_n2, "ΣΥΓΚΡΟΥΣΗ"]
-            toks2 = set(parse_friends_cell(n2_conf_cell.values[0] if not n2_conf_cell.empty else ""))
-            if (next_name in toks2) or (n2 in toks_next):
-                return False
-    return True
+def _build_student_index(df: pd.DataFrame, step1_col: str, class_labels: List[str]) -> Dict[str, Any]:
+    """
+    Ευρετήριο μαθητών, χτίζεται ΜΙΑ φορά ανά κλήση του Βήματος 2 ώστε τα hot paths
+    (έλεγχοι εφικτότητας, ταξινόμηση, φύλλα backtracking) να μη σαρώνουν τη στήλη ΟΝΟΜΑ:
+      - pos: όνομα -> θέση πρώτης γραμμής (όπως το df[df["ΟΝΟΜΑ"] == n].iloc[0])
+      - rows: όνομα -> όλες οι θέσεις γραμμών με αυτό το όνομα
+      - Z / I: σημαίες ΖΩΗΡΟΣ / ΙΔΙΑΙΤΕΡΟΤΗΤΑ ανά γραμμή (NumPy bool arrays)
+      - conflicts: όνομα -> σύνολο ονομάτων από τη ΣΥΓΚΡΟΥΣΗ της πρώτης γραμμής
+      - friends: όνομα -> σύνολο ΦΙΛΟΙ της πρώτης γραμμής (όπως το friends_map)
+      - degree: όνομα -> #συγκρούσεις + #φίλοι της πρώτης γραμμής
+      - fixed_by_class: τμήμα -> ονόματα ήδη τοποθετημένα από το Βήμα 1
+    """
+    names = df["ΟΝΟΜΑ"].astype(str).tolist()
+    pos: Dict[str, int] = {}
+    rows: Dict[str, List[int]] = {}
+    for p, n in enumerate(names):
+        pos.setdefault(n, p)
+        rows.setdefault(n, []).append(p)
+
+    def _cells(col: str) -> List[Any]:
+        return df[col].tolist() if col in df.columns else [""] * len(df)
+
+    conflict_cells = _cells("ΣΥΓΚΡΟΥΣΗ")
+    friend_cells = _cells("ΦΙΛΟΙ")
+    conflicts: Dict[str, Set[str]] = {}
+    friends: Dict[str, Set[str]] = {}
+    degree: Dict[str, int] = {}
+    for n, p in pos.items():
+        conf = parse_friends_cell(conflict_cells[p])
+        fr = parse_friends_cell(friend_cells[p])
+        conflicts[n] = set(conf)
+        friends[n] = set(fr)
+        degree[n] = len(conf) + len(fr)
+
+    step1_vals = df[step1_col]
+    fixed_by_class = {
+        cl: set(df.loc[pd.notna(step1_vals) & (step1_vals == cl), "ΟΝΟΜΑ"].astype(str))
+        for cl in class_labels
+    }
+    # Κωδικοί τμήματος Βήματος 1 ανά γραμμή (-1 = χωρίς τμήμα), ομαδοποίηση κατά str(τμήμα)
+    class_code = {cl: c for c, cl in enumerate(class_labels)}
+    step1_codes = np.array(
+        [class_code.setdefault(str(v), len(class_code)) if pd.notna(v) else -1 for v in step1_vals],
+        dtype=np.int64,
+    )
+    return {
+        "pos": pos,
+        "rows": rows,
+        "class_code": class_code,
+        "step1_codes": step1_codes,
+        "Z": yes_mask(df, "ΖΩΗΡΟΣ").to_numpy(),
+        "I": yes_mask(df, "ΙΔΙΑΙΤΕΡΟΤΗΤΑ").to_numpy(),
+        "conflicts": conflicts,
+        "friends": friends,
+        "degree": degree,
+        "has_conflicts": "ΣΥΓΚΡΟΥΣΗ" in df.columns,
+        "fixed_by_class": fixed_by_class,
+    }
 
 def _extract_step1_id(step1_col_name: str) -> int:
     m = re.search(r'(?:ΒΗΜΑ1_|V1_)ΣΕΝΑΡΙΟ[_\s]*(\d+)', str(step1_col_name))
@@ -154,10 +152,17 @@ def step2_apply_FIXED_v3(
     *,
     seed: int = 42,
     max_results: int = 5,
+    max_nodes: Optional[int] = None,
+    time_limit_s: Optional[float] = None,
 ) -> List[Tuple[str, pd.DataFrame, Dict[str, Any]]]:
     """
     Επιστρέφει έως max_results σενάρια ως (label, DataFrame, metrics).
     Το DataFrame περιέχει στήλες εισόδου + «ΒΗΜΑ2_ΣΕΝΑΡΙΟ_{k}» όπου k = id του ΒΗΜΑ1_ΣΕΝΑΡΙΟ_k.
+
+    Anytime: με max_nodes (κόμβοι αναζήτησης) ή/και time_limit_s (δευτερόλεπτα)
+    η αναζήτηση σταματά μόλις εξαντληθεί ο προϋπολογισμός και επιστρέφονται τα
+    καλύτερα σενάρια που βρέθηκαν ως τότε. Τα metrics περιέχουν «search_complete»
+    (False αν κόπηκε) και «nodes» (κόμβοι που επισκέφθηκε).
     """
     random.seed(seed)
     df = normalize_columns(df_in).copy()
@@ -167,100 +172,395 @@ def step2_apply_FIXED_v3(
 
     to_place = df[(pd.isna(df[step1_col_name])) & ((df["ΖΩΗΡΟΣ"] == "Ν") | (df["ΙΔΙΑΙΤΕΡΟΤΗΤΑ"] == "Ν"))]["ΟΝΟΜΑ"].astype(str).tolist()
     targets = _compute_targets_global(df, step1_col=step1_col_name, class_labels=class_labels)
+    index = _build_student_index(df, step1_col_name, class_labels)
+    pos, Z, I = index["pos"], index["Z"], index["I"]
 
-    best: List[Tuple[pd.DataFrame, int, int, int, int]] = []
     assign: Dict[str, str] = {}
 
-    def deg(name: str) -> int:
-        row = df[df["ΟΝΟΜΑ"] == name].iloc[0]
-        return len(parse_friends_cell(row.get("ΣΥΓΚΡΟΥΣΗ", ""))) + len(parse_friends_cell(row.get("ΦΙΛΟΙ", "")))
+    # Τρέχουσα κατάσταση περιορισμών, ενημερώνεται σε O(1) σε place/unplace:
+    # Ζ/Ι ανά τμήμα (Βήμα 1 + assign), μέλη assign ανά τμήμα, πλήθος αναφορών
+    # κάθε ονόματος στις ΣΥΓΚΡΟΥΣΗ των μελών του τμήματος, και πόσα τμήματα
+    # ξεπερνούν ήδη το max Ζ ή Ι.
+    conflicts, fixed_by_class = index["conflicts"], index["fixed_by_class"]
+    check_conflicts = index["has_conflicts"]
+    z_max, i_max = targets["Z"]["max"], targets["I"]["max"]
+    Zc = dict(targets["Z_step1"])
+    Ic = dict(targets["I_step1"])
+    members: Dict[str, Set[str]] = {cl: set() for cl in class_labels}
+    named_in_conflicts: Dict[str, Counter] = {cl: Counter() for cl in class_labels}
+    over = [sum(Zc[cl] > z_max or Ic[cl] > i_max for cl in class_labels)]
+
+    def _shift(name: str, cl: str, sign: int) -> None:
+        was_over = Zc[cl] > z_max or Ic[cl] > i_max
+        p = pos[name]
+        Zc[cl] += sign * int(Z[p])
+        Ic[cl] += sign * int(I[p])
+        over[0] += (Zc[cl] > z_max or Ic[cl] > i_max) - was_over
+        if sign > 0:
+            members[cl].add(name)
+            named_in_conflicts[cl].update(conflicts[name])
+        else:
+            members[cl].discard(name)
+            named_in_conflicts[cl].subtract(conflicts[name])
+
+    def place(name: str, cl: str) -> None:
+        if name in assign:
+            _shift(name, assign[name], -1)
+        assign[name] = cl
+        _shift(name, cl, +1)
+
+    def unplace(name: str) -> None:
+        _shift(name, assign[name], -1)
+        del assign[name]
+
+    def feasible(name: str, cl: str) -> bool:
+        """Όπως αν το name τοποθετούνταν στο cl: κανένα τμήμα πάνω από το max Ζ/Ι
+        και καμία σύγκρουση με μαθητή του cl (Βήματος 1 ή ήδη τοποθετημένο)."""
+        if not name:
+            return over[0] == 0
+        p = pos[name]
+        dz, di = int(Z[p]), int(I[p])
+        old = assign.get(name)
+        delta = {cl: [dz, di]}
+        if old is not None:
+            delta.setdefault(old, [0, 0])
+            delta[old][0] -= dz
+            delta[old][1] -= di
+        over_after = over[0]
+        for c, (ddz, ddi) in delta.items():
+            over_after -= Zc[c] > z_max or Ic[c] > i_max
+            over_after += Zc[c] + ddz > z_max or Ic[c] + ddi > i_max
+        if over_after > 0:
+            return False
+
+        if check_conflicts:
+            toks = conflicts[name]
+            if not toks.isdisjoint(fixed_by_class.get(cl, ())):
+                return False
+            # Μέλη του cl που αναφέρουν το name (χωρίς το ίδιο αν μετακινείται)
+            mentioned = named_in_conflicts[cl][name]
+            if old == cl and name in toks:
+                mentioned -= 1
+            if mentioned > 0 or name in toks:
+                return False
+            if any(n2 in members[cl] for n2 in toks if n2 != name):
+                return False
+        return True
 
     to_place_sorted = sorted(
         to_place,
         key=lambda n: (
-            -(
-                str(df.loc[df["ΟΝΟΜΑ"] == n, "ΖΩΗΡΟΣ"].values[0]).strip() == "Ν"
-                and str(df.loc[df["ΟΝΟΜΑ"] == n, "ΙΔΙΑΙΤΕΡΟΤΗΤΑ"].values[0]).strip() == "Ν"
-            ),
-            -(str(df.loc[df["ΟΝΟΜΑ"] == n, "ΙΔΙΑΙΤΕΡΟΤΗΤΑ"].values[0]).strip() == "Ν"),
-            -(str(df.loc[df["ΟΝΟΜΑ"] == n, "ΖΩΗΡΟΣ"].values[0]).strip() == "Ν"),
-            -deg(n),
+            -bool(Z[pos[n]] and I[pos[n]]),
+            -bool(I[pos[n]]),
+            -bool(Z[pos[n]]),
+            -index["degree"][n],
         ),
     )
 
+    # Βαθμολόγηση χωρίς DataFrame: πλήθη τύπων (Ζ/Ι) ανά τμήμα για τις γραμμές
+    # με οριστικό τμήμα — μαθητές εκτός to_place (Βήμα 1) + όσοι έχουν τοποθετηθεί.
+    # Μια τοποθέτηση γράφει ΟΛΕΣ τις γραμμές του ονόματος (όπως το .loc ανά όνομα).
+    rows_of, class_code = index["rows"], index["class_code"]
+    to_place_set = set(to_place)
+    row_types = Z.astype(np.int64) + 2 * I.astype(np.int64)
+    class_types = np.zeros((len(class_code), 4), dtype=np.int64)
+    for r, code in enumerate(index["step1_codes"]):
+        if code >= 0 and row_types[r] and df["ΟΝΟΜΑ"].iat[r] not in to_place_set:
+            class_types[code, row_types[r]] += 1
+    name_types = {
+        n: np.bincount(row_types[rows_of[n]], minlength=4) * np.array([0, 1, 1, 1]) for n in to_place_set
+    }
+    # Ποινή/ζεύγος-με-ποινή ανά συνδυασμό τύπων (0: κανένα, 1: Ζ, 2: Ι, 3: Ζ+Ι)
+    type_penalty = np.array([[_pair_conflict_penalty(t & 1, t & 2, u & 1, u & 2) for u in range(4)]
+                             for t in range(4)], dtype=np.int64)
+    type_conflict = (type_penalty > 0).astype(np.int64)
+    open_nt = np.array([name_types[n] for n in to_place_sorted], dtype=np.int64).reshape(-1, 4)
+
+    mutual_pairs = mutual_pairs_in_scope(df, scope, friends=index["friends"])
+
+    def _fixed_class(name: str) -> int:
+        # όπως το name2class: η τελευταία γραμμή με τμήμα κερδίζει
+        for r in reversed(rows_of.get(name, [])):
+            if index["step1_codes"][r] >= 0:
+                return int(index["step1_codes"][r])
+        return -1
+
+    fixed_class = {n: _fixed_class(n) for pair in mutual_pairs for n in pair if n not in to_place_set}
+
+    def _class_of(name: str) -> Optional[int]:
+        """Τμήμα ονόματος στην τρέχουσα μερική ανάθεση (None = δεν έχει τοποθετηθεί ακόμη)"""
+        if name in to_place_set:
+            cl = assign.get(name)
+            return None if cl is None else class_code[cl]
+        return fixed_class[name]
+
+    def _broken_so_far() -> int:
+        broken = 0
+        for a, b in mutual_pairs:
+            ca, cb = _class_of(a), _class_of(b)
+            if ca is not None and cb is not None and ca != cb:
+                broken += 1
+        return broken
+
+    def _move_types(name: str, cl: str, sign: int) -> None:
+        if name in name_types:
+            class_types[class_code[cl]] += sign * name_types[name]
+
+    def score_leaf() -> Tuple[int, int, int]:
+        conf_sum, ped_cnt = _conflict_kernel(class_types)
+        return ped_cnt, _broken_so_far(), conf_sum
+
+    # Κλειδί επιλογής (μικρότερο = καλύτερο), ίδιο με την τελική επιλογή:
+    # χωρίς παιδαγωγικές συγκρούσεις -> (0, broken, total), αλλιώς (1, total, broken)
+    def _selection_key(ped_cnt: int, broken: int, total: int) -> Tuple[int, int, int]:
+        return (0, broken, total) if ped_cnt == 0 else (1, total, broken)
+
+    def lower_bound_key() -> Tuple[int, int, int]:
+        """
+        Αισιόδοξο κλειδί για κάθε φύλλο κάτω από τη μερική ανάθεση: οι ποινές των
+        οριστικών γραμμών μόνο αυξάνονται, κάθε μαθητής που απομένει προσθέτει
+        τουλάχιστον τη μικρότερη ποινή που θα έπαιρνε σε κάποιο τμήμα του πεδίου
+        του, και τα ήδη σπασμένα αμοιβαία ζεύγη μένουν σπασμένα.
+        """
+        conf_sum, ped_cnt = _conflict_kernel(class_types)
+        open_types = class_types[:len(class_labels)]
+        # (μαθητής × τμήμα): ποινή / ζεύγη με ποινή αν μπει εκεί
+        pen = (open_nt @ (open_types @ type_penalty).T).tolist()
+        cnt = (open_nt @ (open_types @ type_conflict).T).tolist()
+        for s in _slots(open_bits[0]):
+            cs = _classes(s)
+            conf_sum += min(pen[s][c] for c in cs)
+            ped_cnt += min(cnt[s][c] for c in cs)
+        broken = _broken_so_far()
+        return _selection_key(ped_cnt, broken, conf_sum + 5 * broken)
+
+    # Φραγμένο top-K: κρατιούνται μόνο τα (έως max_results) φύλλα με το καλύτερο
+    # κλειδί, και μέσα στο κλειδί τα μικρότερα κατά «tie» — η σειρά που θα τα
+    # έβρισκε η στατική αναζήτηση (βλ. _static_order), ό,τι θα επέλεγε η τελική
+    # επιλογή από όλα.
+    best: List[Tuple[Tuple[int, ...], Tuple[Tuple[str, str], ...], int, int, int, int]] = []  # (tie, ανάθεση, ped, broken, total, conf)
+    best_key: List[Optional[Tuple[int, int, int]]] = [None]
+    limit = max(1, int(max_results))
+    use_bound = len(to_place_set) == len(to_place)  # διπλότυπα ονόματα: χωρίς κλάδεμα
+
+    def _cannot_improve(key: Tuple[int, int, int], tie: Optional[Tuple[int, ...]] = None) -> bool:
+        """Κανένα φύλλο με αυτό το κλειδί δεν μπαίνει στο best. Στο ίδιο κλειδί με
+        γεμάτο best: tie (ή πρόθεμά του) μετά το χειρότερο κρατημένο, ή tie=None."""
+        if best_key[0] is None or key < best_key[0]:
+            return False
+        if key > best_key[0]:
+            return True
+        return len(best) >= limit and (tie is None or tie > best[-1][0][:len(tie)])
+
+    # Συμμετρία τμημάτων: τμήματα χωρίς ΚΑΝΕΝΑ μαθητή Βήματος 1 και χωρίς
+    # τοποθετημένα μέλη είναι εναλλάξιμα (ίδια εφικτότητα και ποινές) — αρκεί
+    # το πρώτο από αυτά, τα υπόλοιπα δίνουν τα ίδια σενάρια με άλλες ετικέτες.
+    has_step1 = {cl: bool((index["step1_codes"] == class_code[cl]).any()) for cl in class_labels}
+
+    def _blank(cl: str) -> bool:
+        return not has_step1[cl] and not members[cl]
+
+    # Forward checking: col[c] = bitmask των θέσεων του to_place_sorted που χωρούν
+    # ακόμη στο τμήμα c (όριο max Ζ/Ι, ΣΥΓΚΡΟΥΣΗ με Βήμα 1 ή με ήδη τοποθετημένους)
+    # — ακριβώς ό,τι θα απαντούσε η feasible. Μια τοποθέτηση αλλάζει μόνο το δικό
+    # της τμήμα, άρα ενημερώνεται μία στήλη. Διακλάδωση στον μαθητή με το
+    # μικρότερο πεδίο (MRV, ισοπαλίες με τη σειρά του to_place_sorted).
+    # Διπλότυπα/κενά ονόματα: στατική σειρά με feasible, όπως πριν.
+    use_fc = use_bound and "" not in to_place_set
+    n_open, k = len(to_place_sorted), len(class_labels)
+    open_bits = [(1 << n_open) - 1]
+    col = [open_bits[0]] * k
+    z_bits = i_bits = 0
+    clash = [0] * n_open  # ΣΥΓΚΡΟΥΣΗ προς οποιαδήποτε κατεύθυνση
+    if use_fc:
+        slot = {n: s for s, n in enumerate(to_place_sorted)}
+        for s, n in enumerate(to_place_sorted):
+            z_bits |= int(Z[pos[n]]) << s
+            i_bits |= int(I[pos[n]]) << s
+        if over[0] > 0:
+            col = [0] * k
+
+    def _capped(cl: str) -> int:
+        """Μαθητές που δεν χωρούν πια στο cl λόγω max Ζ/Ι"""
+        return (z_bits if Zc[cl] >= z_max else 0) | (i_bits if Ic[cl] >= i_max else 0)
+
+    if use_fc:
+        for c, cl in enumerate(class_labels):
+            col[c] &= ~_capped(cl)
+        if check_conflicts:
+            for s, n in enumerate(to_place_sorted):
+                toks = conflicts[n]
+                for c, cl in enumerate(class_labels):
+                    if n in toks or not toks.isdisjoint(fixed_by_class.get(cl, ())):
+                        col[c] &= ~(1 << s)
+                for t in toks:
+                    if t in slot:
+                        clash[s] |= 1 << slot[t]
+                        clash[slot[t]] |= 1 << s
+
+    def _classes(s: int) -> List[int]:
+        return [c for c in range(k) if col[c] >> s & 1]
+
+    def _slots(bits: int) -> List[int]:
+        return [s for s in range(n_open) if bits >> s & 1]
+
+    def _restrict(s: int, c: int) -> int:
+        """Μετά την τοποθέτηση του s στο τμήμα c: κόβει το c από όσους δεν χωρούν
+        πια. Επιστρέφει τα bits που αφαιρέθηκαν, για την αναίρεση."""
+        removed = col[c] & (clash[s] | _capped(class_labels[c]))
+        col[c] ^= removed
+        return removed
+
+    def _viable() -> bool:
+        """Κανένα κενό πεδίο, και κάθε τμήμα μπορεί ακόμη να φτάσει το q σε Ζ και Ι."""
+        left = open_bits[0]
+        for c, cl in enumerate(class_labels):
+            reach = col[c] & open_bits[0]
+            left &= ~reach
+            if Zc[cl] + bin(reach & z_bits).count("1") < targets["Z"]["q"]:
+                return False
+            if Ic[cl] + bin(reach & i_bits).count("1") < targets["I"]["q"]:
+                return False
+        return left == 0
+
+    def _next_slot(i: int) -> int:
+        if not use_fc:
+            return i
+        return min(_slots(open_bits[0]), key=lambda s: sum(x >> s & 1 for x in col))
+
+    # Η στατική αναζήτηση (σειρά to_place_sorted, τμήματα κατά ετικέτα) βρίσκει τα
+    # φύλλα σε λεξικογραφική σειρά του διανύσματος τμημάτων ανά θέση, και από τα
+    # εναλλάξιμα κενά τμήματα χρησιμοποιεί πρώτα το μικρότερο. Το MRV βρίσκει άλλον
+    # εκπρόσωπο της ίδιας κλάσης συμμετρίας: μετονομάζονται τα κενά τμήματα με τη
+    # σειρά πρώτης εμφάνισης, ώστε οι ισοπαλίες να λύνονται όπως πριν.
+    blank_codes = [c for c, cl in enumerate(class_labels) if not has_step1[cl]]
+    label_code = {cl: c for c, cl in enumerate(class_labels)}
+
+    def _static_order(upto: int) -> Tuple[int, ...]:
+        """Διάνυσμα τμημάτων των θέσεων 0..upto-1 (όλες τοποθετημένες), κανονικοποιημένο"""
+        relabel: Dict[int, int] = {}
+        vec = []
+        for s in range(upto):
+            c = label_code[assign[to_place_sorted[s]]]
+            if not has_step1[class_labels[c]]:
+                if c not in relabel:
+                    relabel[c] = blank_codes[len(relabel)]
+                c = relabel[c]
+            vec.append(c)
+        return tuple(vec)
+
+    def _prefix_tie() -> Optional[Tuple[int, ...]]:
+        """Κάτω φράγμα του tie στο υποδέντρο: το τοποθετημένο πρόθεμα της στατικής
+        σειράς. Στατική αναζήτηση: κάθε υποδέντρο έρχεται μετά τα ήδη κρατημένα."""
+        if not use_fc:
+            return None
+        free = open_bits[0]
+        return _static_order((free & -free).bit_length() - 1 if free else n_open)
+
+    def materialize(assignment: Dict[str, str]) -> pd.DataFrame:
+        cand = df.copy()
+        cand_col = "ΒΗΜΑ2_TMP"
+        cand[cand_col] = cand[step1_col_name]
+        j = cand.columns.get_loc(cand_col)
+        for n, cl in assignment.items():
+            cand.iloc[rows_of[n], j] = cl
+        return cand
+
+    # Προϋπολογισμός anytime: nodes[0] = κόμβοι, stopped[0] = κόπηκε η αναζήτηση.
+    nodes = [0]
+    stopped = [False]
+    deadline = None if time_limit_s is None else time.perf_counter() + float(time_limit_s)
+
+    def _out_of_budget() -> bool:
+        if max_nodes is not None and nodes[0] >= max_nodes:
+            stopped[0] = True
+        elif deadline is not None and (nodes[0] & 255) == 0 and time.perf_counter() > deadline:
+            stopped[0] = True
+        return stopped[0]
+
     def backtrack(i: int) -> None:
+        if stopped[0] or _out_of_budget():
+            return
+        nodes[0] += 1
         if i == len(to_place_sorted):
-            cand = df.copy()
-            cand_col = "ΒΗΜΑ2_TMP"
-            cand[cand_col] = cand[step1_col_name]
-            for n, cl in assign.items():
-                cand.loc[cand["ΟΝΟΜΑ"] == n, cand_col] = cl
-
-            counts_new = {cl: 0 for cl in class_labels}
-            for cl in assign.values():
-                counts_new[cl] += 1
+            counts_new = {cl: len(members[cl]) for cl in class_labels}
             if sum(counts_new.values()) > 0 and max(counts_new.values()) == sum(counts_new.values()):
                 return
 
-            Zc = targets["Z_step1"].copy()
-            Ic = targets["I_step1"].copy()
-            for n, cl in assign.items():
-                row = df[df["ΟΝΟΜΑ"] == n].iloc[0]
-                if str(row.get("ΖΩΗΡΟΣ", "")).strip() == "Ν": Zc[cl] += 1
-                if str(row.get("ΙΔΙΑΙΤΕΡΟΤΗΤΑ", "")).strip() == "Ν": Ic[cl] += 1
             for cl in class_labels:
                 if not (targets["Z"]["q"] <= Zc[cl] <= targets["Z"]["max"]): return
                 if not (targets["I"]["q"] <= Ic[cl] <= targets["I"]["max"]): return
 
-            ped_cnt = _count_ped_conflicts(cand, cand_col)
-            conf_sum = _sum_conflicts(cand, cand_col)
-            broken = _broken_mutual_pairs(cand, cand_col, scope)
+            ped_cnt, broken, conf_sum = score_leaf()
             total = conf_sum + 5 * broken
-            best.append((cand, ped_cnt, broken, total, conf_sum))
+            key = _selection_key(ped_cnt, broken, total)
+            # Χωρίς FC η σειρά εύρεσης είναι ήδη η στατική: tie = αύξων αριθμός
+            tie = _static_order(n_open) if use_fc else (nodes[0],)
+            if _cannot_improve(key, tie):
+                return
+            if best_key[0] is None or key < best_key[0]:
+                best_key[0] = key
+                best.clear()
+            if use_fc:
+                items = tuple((n, class_labels[c]) for n, c in zip(to_place_sorted, tie))
+            else:
+                items = tuple(assign.items())
+            bisect.insort(best, (tie, items, ped_cnt, broken, total, conf_sum), key=lambda e: e[0])
+            del best[limit:]
             return
 
-        name = to_place_sorted[i]
-        for cl in class_labels:
-            if not _prereject(assign, name, cl, df, step1_col_name, class_labels, targets):
-                continue
-            assign[name] = cl
-            backtrack(i + 1)
-            del assign[name]
+        if use_bound:
+            key = lower_bound_key()
+            if _cannot_improve(key, _prefix_tie() if best_key[0] == key else None):
+                return
 
-    backtrack(0)
+        s = _next_slot(i)
+        name = to_place_sorted[s]
+        blank_tried = False
+        for c in _classes(s):
+            cl = class_labels[c]
+            if stopped[0]:
+                return
+            if _blank(cl):
+                if blank_tried:
+                    continue
+                blank_tried = True
+            if not use_fc and not feasible(name, cl):
+                continue
+            place(name, cl)
+            _move_types(name, cl, +1)
+            open_bits[0] ^= 1 << s
+            if use_fc:
+                removed = _restrict(s, c)
+                if _viable():
+                    backtrack(i + 1)
+                col[c] |= removed
+            else:
+                backtrack(i + 1)
+            open_bits[0] ^= 1 << s
+            _move_types(name, cl, -1)
+            unplace(name)
+
+    if not use_fc or _viable():
+        backtrack(0)
+    search = {"search_complete": not stopped[0], "nodes": nodes[0]}
 
     if not best:
         tmp = df.copy()
         base_id = _extract_step1_id(step1_col_name)
         tmp[f"ΒΗΜΑ2_ΣΕΝΑΡΙΟ_{base_id}"] = tmp[step1_col_name]
-        return [("option_1", tmp, {"ped_conflicts": None, "broken": None, "penalty": None})]
-
-    zero_ped = [x for x in best if x[1] == 0]
-    selected = []
-
-    total_pairs = len(mutual_pairs_in_scope(df, scope))
-
-    if zero_ped:
-        min_broken = min(x[2] for x in zero_ped)
-        tier1 = [x for x in zero_ped if x[2] == min_broken]
-        min_total = min(x[3] for x in tier1)
-        tier2 = [x for x in tier1 if x[3] == min_total]
-        selected = tier2
-    else:
-        min_total = min(x[3] for x in best)
-        tier1 = [x for x in best if x[3] == min_total]
-        max_preserved = max(total_pairs - x[2] for x in tier1)
-        tier2 = [x for x in tier1 if (total_pairs - x[2]) == max_preserved]
-        selected = tier2
+        return [("option_1", tmp, {"ped_conflicts": None, "broken": None, "penalty": None, **search})]
+
+    selected = best
 
     results: List[Tuple[str, pd.DataFrame, Dict[str, Any]]] = []
     base_id = _extract_step1_id(step1_col_name)
-    for k, (cand, ped_cnt, broken, total, conf_sum) in enumerate(selected, start=1):
-        out = cand.copy()
+    for k, (_, assignment, ped_cnt, broken, total, conf_sum) in enumerate(selected, start=1):
+        out = materialize(dict(assignment))
         final_col = f"ΒΗΜΑ2_ΣΕΝΑΡΙΟ_{base_id}"
         out[final_col] = out["ΒΗΜΑ2_TMP"]
         out.drop(columns=["ΒΗΜΑ2_TMP"], inplace=True)
         results.append((f"option_{k}", out, {
-            "ped_conflicts": int(ped_cnt), "broken": int(broken), "penalty": int(total),
+            "ped_conflicts": int(ped_cnt), "broken": int(broken), "penalty": int(total), **search,
         }))
     return results
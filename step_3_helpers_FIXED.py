@@ -3,13 +3,14 @@
 """
 step_3_helpers_FIXED.py
 - ΦΙΛΟΙ parsing από string ή list
-- Έλεγχος ΑΜΟΙΒΑΙΑΣ φιλίας (μόνο ΔΥΑΔΕΣ)
+- Έλεγχος ΑΜΟΙΒΑΙΑΣ φιλίας (μόνο ΔΥΑΔΕΣ) μέσω ευρετηρίου γειτνίασης (mutual_adjacency)
 - Μέτρηση «σπασμένων» φιλικών ΔΥΑΔΩΝ (χωρίς διπλομέτρηση)
 - Penalty score για Βήμα 3
 - Επιλογή σεναρίων βάσει θεωρίας
 """
 
-from typing import List, Tuple, Dict, Set
+from typing import List, Tuple, Dict, Set, Optional
+from collections import Counter
 import pandas as pd
 import re, ast
 
@@ -43,19 +44,45 @@ def are_mutual_pair(df: pd.DataFrame, a: str, b: str) -> bool:
     fb = set(parse_friends_string(rb.iloc[0].get("ΦΙΛΟΙ","")))
     return (str(b).strip() in fa) and (str(a).strip() in fb)
 
-def mutual_dyads(df: pd.DataFrame) -> Set[Tuple[str,str]]:
+def mutual_adjacency(df: pd.DataFrame) -> Dict[str, List[str]]:
+    """
+    Όνομα -> αμοιβαίοι φίλοι, με τη σειρά του κελιού ΦΙΛΟΙ. Ένα parse ανά μαθητή
+    και O(Σ βαθμών) συνολικά· ίδια απάντηση με την are_mutual_pair (πρώτη γραμμή
+    ανά όνομα): v ∈ adj[u] ⇔ are_mutual_pair(df, u, v).
+    """
+    names = df["ΟΝΟΜΑ"].astype(str).tolist()
+    cells = df["ΦΙΛΟΙ"].tolist() if "ΦΙΛΟΙ" in df.columns else [""] * len(df)
+    friends: Dict[str, List[str]] = {}
+    for name, cell in zip(names, cells):
+        # μη-str (NaN σε pandas με string dtype) δεν ταιριάζει ποτέ με str(a)
+        if isinstance(name, str) and name not in friends:
+            friends[name] = parse_friends_string(cell)
+    sets = {name: set(f) for name, f in friends.items()}
+    return {
+        name: [v for v in f if v in sets and str(name).strip() in sets[v]]
+        for name, f in friends.items()
+    }
+
+def mutual_dyads(df: pd.DataFrame, adjacency: Optional[Dict[str, List[str]]] = None) -> Set[Tuple[str,str]]:
     names = df["ΟΝΟΜΑ"].astype(str).str.strip().tolist()
+    if adjacency is None:
+        adjacency = mutual_adjacency(df)
     pairs: Set[Tuple[str,str]] = set()
-    for i, a in enumerate(names):
-        for b in names[i+1:]:
-            if are_mutual_pair(df, a, b):
-                pairs.add(tuple(sorted([a,b])))
+    for a, cnt in Counter(names).items():
+        for b in adjacency.get(a, ()):
+            # (a, a): μόνο αν το όνομα εμφανίζεται σε δύο γραμμές
+            if b != a or cnt > 1:
+                pairs.add(tuple(sorted([a, b])))
     return pairs
 
-def count_broken_dyads(before_df: pd.DataFrame, after_df: pd.DataFrame, scenario_col: str) -> int:
+def count_broken_dyads(before_df: pd.DataFrame, after_df: pd.DataFrame, scenario_col: str,
+                       adjacency: Optional[Dict[str, List[str]]] = None) -> int:
     """Μετρά πόσες αμοιβαίες ΔΥΑΔΕΣ σπάνε στο after_df (δηλ. κατανέμονται σε διαφορετικές τάξεις)."""
-    pairs = mutual_dyads(before_df)
-    name2class = {str(r["ΟΝΟΜΑ"]).strip(): str(r.get(scenario_col)) for _, r in after_df.iterrows() if pd.notna(r.get(scenario_col))}
+    pairs = mutual_dyads(before_df, adjacency)
+    name2class: Dict[str, str] = {}
+    if scenario_col in after_df.columns:
+        placed = after_df[after_df[scenario_col].notna()]
+        name2class = dict(zip(placed["ΟΝΟΜΑ"].map(lambda x: str(x).strip()), placed[scenario_col].map(str)))
     broken=0
     for a,b in pairs:
         ca = name2class.get(a); cb = name2class.get(b)